@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+
+import json
+import sqlite3
+import threading
+
+from utils.with_logger import WithLogger
+
+
+class ActivityIndex(WithLogger):
+    """
+    An on-disk (SQLite) record of channel activity, so each run only needs to read history newer than the last.
+
+    Per channel ID it keeps the span of history that has been read (`synced_from` to `synced_to`), and the
+    timestamp of the newest message in that span which counted as activity (`last_activity`, None if none did).
+    Entries recorded under different activity rules (e.g. another `ignore_users`) are disregarded.
+    """
+
+    def __init__(self, path, rules):
+        """
+        path is the SQLite database file (":memory:" for a throwaway index)
+        rules is any JSON-serializable description of what counts as activity
+        """
+        self.rules = json.dumps(rules, sort_keys=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS channel_activity ("
+                "channel_id TEXT PRIMARY KEY, last_activity REAL, synced_from REAL, synced_to REAL, rules TEXT)"
+            )
+
+    def get(self, cid):
+        """Return `(last_activity, synced_from, synced_to)` for channel `cid`, or None if it has not been synced."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT last_activity, synced_from, synced_to, rules FROM channel_activity WHERE channel_id = ?", (cid,)
+            ).fetchone()
+        if row is None or row[3] != self.rules:
+            return None
+        return row[:3]
+
+    def update(self, cid, last_activity, synced_from, synced_to):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO channel_activity (channel_id, last_activity, synced_from, synced_to, rules) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cid, last_activity, synced_from, synced_to, self.rules)
+            )
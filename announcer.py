@@ -13,7 +13,7 @@ class Announcer(executor.Executor):
 
         now = int(time.time())
         dayago = now - 86400
-        channels = self.slacker.get_all_channel_objects()
+        channels = self.slacker.channel_objects
         new_channels = [channel for channel in channels if channel['created'] > dayago]
         new = []
         for new_channel in new_channels:
@@ -27,14 +27,17 @@ class Announcer(executor.Executor):
     def announce(self):
         self.logger.info("Announcing")
         new = self.get_new_channels()
+        announcements = []
         for cname, creator, purpose in new:
             m = "Channel #{} was created by @{} with purpose: {}".format(cname, creator, purpose)
             if self.config.activated:
                 if self.slacker.channel_exists(self.config.announce_channel):
-                    self.slackbot.say(self.config.announce_channel, m)
+                    announcements.append((self.config.announce_channel, m))
                 else:
                     self.logger.warning("Attempted to announce in %s, but channel does not exist.", self.config.announce_channel)
             self.logger.info("ANNOUNCE: %s", m)
+        if announcements:
+            self.slackbot.say_many(announcements)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+#! /usr/bin/env python3
+"""
+asyncio counterpart of destalinator.Destalinator, driven by async_slacker.AsyncSlacker.
+
+This needs Python 3.5+ and the optional aiohttp dependency.
+"""
+
+import asyncio
+from datetime import date
+
+import destalinator
+
+# Destalinator methods that drive the sync API, or would hand un-awaited coroutines to it
+SYNC_ONLY_METHODS = ('evaluate_channels', 'safe_archive_all', 'warn_all', 'warn_in_general', 'iter_messages',
+                     'stream_history', 'newest_activity', 'recently_active')
+
+
+class AsyncDestalinator(destalinator.Destalinator):
+    """
+    Destalinator whose checks and channel actions are coroutines.
+
+    `slacker` should be an initialized async_slacker.AsyncSlacker() object. Only the per-channel checks and
+    actions (`stale`, `stale_channels`, `warn`, `archive`, `safe_archive`) are asynchronous; the sync-only
+    methods in SYNC_ONLY_METHODS raise TypeError.
+    """
+
+    async def channel_minimum_age(self, channel_name, days):
+        """Return True if channel represented by `channel_name` is at least `days` old, otherwise False."""
+        info = await self.slacker.get_channel_info(channel_name)
+        age = info['age']
+        age = age / 86400
+        return age > days
+
+    async def get_messages(self, channel_name, days):
+        """
+        Return `days` worth of messages for channel `channel_name` as MessageRecords, oldest first.
+        Only the parts of that window the history cache does not cover are fetched.
+        """
+        oldest = self.now - days * 86400
+        cid = self.slacker.get_channelid(channel_name)
+
+        older, cached, newer = self.cache.lookup(cid, oldest, self.now)
+        if older is None and newer is None:
+            self.logger.debug("Returning %s cached messages for #%s over %s days", len(cached), channel_name, days)
+            return cached
+
+        messages = await self.fetch_history(cid, older) + cached + await self.fetch_history(cid, newer)
+        self.logger.debug("Fetched %s messages for #%s over %s days", len(messages), channel_name, days)
+        return messages
+
+    async def fetch_history(self, cid, time_range):
+        """Return the MessageRecords for channel `cid` from `time_range` (or none without one), oldest first, and cache them."""
+        if time_range is None:
+            return []
+        oldest, latest = time_range
+        records = self.compact(await self.slacker.get_messages_in_time_range(oldest, cid, latest))
+        self.cache.add(cid, oldest, latest, records)
+        return records
+
+    async def post_marked_up_message(self, channel_name, message, **kwargs):
+        await self.slacker.post_message(channel_name, self.add_slack_channel_markup(message), **kwargs)
+
+    async def stale(self, channel_name, days):
+        """
+        Return True if channel represented by `channel_name` is stale.
+        Definition of stale is: no messages in the last `days` which are not from config.ignore_users.
+        """
+        if not await self.channel_minimum_age(channel_name, days):
+            return False
+
+        if self.ignore_channel(channel_name):
+            return False
+
+        if await self.slacker.channel_has_only_restricted_members(channel_name):
+            return False
+
+        messages = await self.get_messages(channel_name, days)
+        return not any(self.is_activity(x) for x in messages)
+
+    async def stale_channels(self, days, concurrency=100):
+        """
+        Return the sorted names of every channel stale for more than `days`,
+        with up to `concurrency` channels being checked at once.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(channel):
+            async with semaphore:
+                return await self.stale(channel, days)
+
+        channels = sorted(self.slacker.channels_by_name.keys())
+        results = await asyncio.gather(*[check(channel) for channel in channels])
+        return [channel for channel, is_stale in zip(channels, results) if is_stale]
+
+    # channel actions
+
+    async def archive(self, channel_name):
+        """Archive the given channel name, returning the Slack API response as a JSON string."""
+        if self.ignore_channel(channel_name):
+            self.logger.debug("Not archiving #%s because it's in ignore_channels", channel_name)
+            return
+
+        if self.config.activated:
+            self.logger.debug("Announcing channel closure in #%s", channel_name)
+            await self.post_marked_up_message(channel_name, self.closure_text, message_type='channel_archive')
+
+            members = await self.slacker.get_channel_member_names(channel_name)
+            say = "Members at archiving are {}".format(", ".join(sorted(members)))
+            self.logger.debug("Telling channel #%s: %s", channel_name, say)
+            await self.post_marked_up_message(channel_name, say, message_type='channel_archive_members')
+
+            self.action("Archiving channel #{}".format(channel_name))
+            payload = await self.slacker.archive(channel_name)
+            self.log_archive_response(channel_name, payload)
+
+            return payload
+
+    async def safe_archive(self, channel_name):
+        """
+        Archive channel if today's date is after `self.earliest_archive_date`
+        and if channel does not only contain single-channel guests.
+        """
+        self.logger.debug("Evaluating #%s for archival", channel_name)
+
+        if await self.slacker.channel_has_only_restricted_members(channel_name):
+            self.logger.debug("Would have archived #%s but it contains only restricted users", channel_name)
+            return
+
+        if date.today() >= self.earliest_archive_date:
+            await self.archive(channel_name)
+        else:
+            self.logger.debug("Would have archived #%s but it's not yet %s", channel_name, self.earliest_archive_date)
+
+    async def warn(self, channel_name, days, force_warn=False):
+        """
+        Send warning text to channel_name, if it has not been sent already in the last `days`.
+        Using `force_warn=True` will warn even if a previous warning exists.
+        Return True if we actually warned, otherwise False.
+        """
+        if await self.slacker.channel_has_only_restricted_members(channel_name):
+            self.logger.debug("Would have warned #%s but it contains only restricted users", channel_name)
+            return False
+
+        if self.ignore_channel(channel_name):
+            self.logger.debug("Not warning #%s because it's in ignore_channels", channel_name)
+            return False
+
+        messages = await self.get_messages(channel_name, days)
+        if not force_warn and self.has_prior_warning(messages):
+            self.logger.debug("Not warning #%s because we found a prior warning", channel_name)
+            return False
+
+        if self.config.activated:
+            await self.post_marked_up_message(channel_name, self.warning_text, message_type='channel_warning')
+            self.action("Warned #{}".format(channel_name))
+
+        return True
+
+
+def sync_only(name):
+    def unsupported(self, *args, **kwargs):
+        raise TypeError("AsyncDestalinator doesn't support {}(); use stale_channels(), warn() and archive()".format(name))
+    unsupported.__name__ = name
+    return unsupported
+
+
+for _name in SYNC_ONLY_METHODS:
+    setattr(AsyncDestalinator, _name, sync_only(_name))
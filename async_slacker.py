@@ -0,0 +1,291 @@
+#! /usr/bin/env python3
+"""
+asyncio counterparts of slacker.Slacker and slackbot.Slackbot.
+
+These need Python 3.5+ and the optional aiohttp dependency.
+"""
+
+import asyncio
+import json
+import time
+
+import aiohttp
+from requests.compat import quote
+
+import slackbot
+import slacker
+
+
+class AsyncSlacker(slacker.Slacker):
+    """
+    Slacker whose Slack Web API calls are coroutines, so many of them can be in flight together on one event loop.
+
+    Lookup and formatting helpers (`get_channelid`, `channel_exists`, `detokenize`, ...) are inherited unchanged.
+    Call `await init()` to load users and channels, and `await close()` once done.
+    """
+
+    def __init__(self, slack_name, token, rate_limiter=None, metrics=None):
+        """
+        slack name is the short name of the slack (preceding '.slack.com')
+        token should be a Slack API Token.
+        rate_limiter is an optional utils.rate_limiter.RateLimiter() to share with other clients of the same Slack.
+        metrics is an optional utils.api_metrics.ApiMetrics() to count requests in.
+        """
+        super(AsyncSlacker, self).__init__(slack_name, token, init=False, rate_limiter=rate_limiter, metrics=metrics)
+        self.session.close()
+        self.session = None
+        # channel ID -> (expiry, future of its channels.info), shared by concurrent lookups
+        self.channel_info_futures = {}
+
+    async def init(self):
+        await self.get_users()
+        await self.get_channels()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def throttle(self, method, channel=None):
+        delay = self.rate_limiter.reserve(method, channel)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    async def timed(self, method, http_method, url, **kwargs):
+        """
+        Make a `http_method` request to `url`, counting it in `metrics` under API `method`.
+        Return the (released) response and its body.
+        """
+        start = time.time()
+        async with self.get_session().request(http_method, url, **kwargs) as response:
+            body = await response.read()
+        self.metrics.record(method, time.time() - start, len(body))
+        return response, body
+
+    async def get_emojis(self):
+        url = self.url + "emoji.list?token={}".format(self.token)
+        return await self.get_with_retry_to_json(url)
+
+    async def get_users(self):
+        self.index_users(await self.get_all_user_objects())
+
+    async def get_with_retry_to_json(self, url):
+        retry_attempts = 0
+        max_retry_attempts = 10
+        method = self.api_method(url)
+        while True:
+            await self.throttle(method)
+            response, body = await self.timed(method, 'GET', url)
+            if response.status < 400:
+                return json.loads(body.decode('utf-8'))
+            if retry_attempts >= max_retry_attempts:
+                response.raise_for_status()
+            if 'Retry-After' in response.headers:
+                retry_after = int(response.headers['Retry-After'])
+                self.logger.debug('Ratelimited on %s. Pausing it for %s', method, retry_after)
+                self.rate_limiter.pause(method, retry_after)
+                self.metrics.record_retry(method, retry_after)
+                continue
+            retry_attempts += 1
+            retry_after = retry_attempts * 5
+            self.metrics.record_retry(method)
+            self.logger.debug('Unknown requests error. Sleeping %s. %s/%s retry attempts.', retry_after, retry_attempts, max_retry_attempts)
+            await asyncio.sleep(retry_after)
+
+    async def get_messages_in_time_range(self, oldest, cid, latest=None):
+        """
+        Return messages in channel `cid` from between `oldest` and `latest` (default: now), oldest first,
+        fetched `history_page_size` at a time.
+        """
+        assert cid in self.channels_by_id, "Unknown channel ID {}".format(cid)
+        cname = self.channels_by_id[cid]
+        latest = latest or int(time.time())
+        url_template = self.url + "channels.history?oldest={}&token={}&channel={}&count={}&latest={}"
+        page_size = int(self.config.history_page_size or 100)
+        pages = []
+        while True:
+            payload = await self.get_with_retry_to_json(url_template.format(oldest, self.token, cid, page_size, latest))
+            page = payload['messages']
+            pages.append(page)
+            if payload['has_more'] is False or not page:
+                break
+            # only the page just received is needed to find the next cursor
+            latest = min(float(x['ts']) for x in page)
+        messages = [message for page in pages for message in page]
+        messages.sort(key=lambda x: float(x['ts']))
+        for message in messages:
+            message['channel'] = cname
+        return messages
+
+    async def get_channels(self, exclude_archived=True):
+        """
+        index the channel directory from channels.list
+        if exclude_archived (default: True), only shows non-archived channels
+        """
+        self.index_channels(await self.get_all_channel_objects(exclude_archived=exclude_archived))
+
+    async def get_channel_members_ids(self, channel_name):
+        """
+        returns an array of member IDs for channel_name
+        """
+        return (await self.get_channel_info(channel_name))['members']
+
+    async def channel_has_only_restricted_members(self, channel_name):
+        """
+        returns True if the channel only has restricted/ultra_restricted
+        members, False otherwise
+        """
+        mids = set(await self.get_channel_members_ids(channel_name))
+        self.logger.debug("Current members in %s are %s", channel_name, mids)
+        return mids.intersection(self.all_restricted_users)
+
+    async def get_channel_member_names(self, channel_name):
+        """
+        returns an array of ["@member"] for members of the channel
+        """
+        members = await self.get_channel_members_ids(channel_name)
+        return ["@" + self.users_by_id[x] for x in members]
+
+    async def get_channel_info(self, channel_name):
+        """
+        returns JSON with channel information.  Adds 'age' in seconds to JSON
+        Answered from channels.list for up to `channel_info_ttl` seconds after bootstrapping. Otherwise
+        channels.info lookups are kept for `channel_info_ttl` seconds, and concurrent lookups of a channel
+        share one request.
+        """
+        cid = self.get_channelid(channel_name)
+        info = self.listed_channel_info(channel_name, cid)
+        if info is None:
+            entry = self.channel_info_futures.get(cid)
+            if entry is None or entry[0] <= time.time() or self.failed(entry[1]):
+                future = asyncio.ensure_future(self.fetch_channel_info(channel_name, cid))
+                entry = self.channel_info_futures[cid] = (time.time() + int(self.config.channel_info_ttl or 0), future)
+            info = dict(await asyncio.shield(entry[1]))
+        info['age'] = int(time.time()) - info['created']
+        return info
+
+    @staticmethod
+    def failed(future):
+        return future.done() and (future.cancelled() or future.exception() is not None)
+
+    async def fetch_channel_info(self, channel_name, cid):
+        url_template = self.url + "channels.info?token={}&channel={}"
+        url = url_template.format(self.token, cid)
+        ret = await self.get_with_retry_to_json(url)
+        if ret['ok'] is not True:
+            m = "Attempted to get channel info for {}, but return was {}"
+            m = m.format(channel_name, ret)
+            raise RuntimeError(m)
+        return ret['channel']
+
+    async def get_all_channel_objects(self, exclude_archived=True):
+        """
+        return all channels
+        if exclude_archived (default: True), only shows non-archived channels
+        """
+        url_template = self.url + "channels.list?exclude_archived={}&token={}"
+        url = url_template.format(1 if exclude_archived else 0, self.token)
+        return await self.get_cursor_pages(url, 'channels')
+
+    async def get_all_user_objects(self):
+        url = self.url + "users.list?token=" + self.token
+        return await self.get_cursor_pages(url, 'members')
+
+    async def get_cursor_pages(self, url, key):
+        """
+        Return the items listed under `key` by the cursor-paginated API `url`, fetched `directory_page_size` at a time.
+        See https://api.slack.com/docs/pagination
+        """
+        page_size = int(self.config.directory_page_size or 200)
+        cursor = ''
+        items = []
+        while True:
+            payload = await self.get_with_retry_to_json(url + "&limit={}&cursor={}".format(page_size, quote(cursor)))
+            assert key in payload
+            items.extend(payload[key])
+            cursor = payload.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return items
+
+    async def archive(self, channel_name):
+        url_template = self.url + "channels.archive?token={}&channel={}"
+        cid = self.get_channelid(channel_name)
+        url = url_template.format(self.token, cid)
+        await self.throttle('channels.archive')
+        _, body = await self.timed('channels.archive', 'POST', url)
+        payload = json.loads(body.decode('utf-8'))
+        self.channel_info_futures.pop(cid, None)
+        if payload.get('ok'):
+            self.forget_channel(cid)
+        return payload
+
+    async def post_message(self, channel, message, message_type=None):
+        """
+        Posts a `message` into a `channel`.
+        Optionally append an invisible attachment with 'fallback' set to `message_type`.
+
+        Note: `channel` value should not be preceded with '#'.
+        """
+        assert channel  # not blank
+        if channel[0] == '#':
+            channel = channel[1:]
+
+        post_data = {
+            'token': self.token,
+            'channel': channel,
+            'text': message
+        }
+
+        bot_name = self.config.bot_name
+        bot_avatar_url = self.config.bot_avatar_url
+        if bot_name or bot_avatar_url:
+            post_data['as_user'] = 'false'
+            if bot_name:
+                post_data['username'] = bot_name
+            if bot_avatar_url:
+                post_data['icon_url'] = bot_avatar_url
+
+        if message_type:
+            post_data['attachments'] = json.dumps([{'fallback': message_type}])
+
+        await self.throttle('chat.postMessage', channel)
+        _, body = await self.timed('chat.postMessage', 'POST', self.url + "chat.postMessage", data=post_data)
+        return json.loads(body.decode('utf-8'))
+
+
+class AsyncSlackbot(slackbot.Slackbot):
+    """Slackbot whose `say` is a coroutine. Call `await close()` once done."""
+
+    def __init__(self, slack_name, token, rate_limiter=None, metrics=None):
+        super(AsyncSlackbot, self).__init__(slack_name, token, rate_limiter=rate_limiter, metrics=metrics)
+        self.session.close()
+        self.session = None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def say(self, channel, statement):
+        """
+        channel should not be preceded with '#'
+        """
+        assert channel  # not blank
+        if channel[0] == '#':
+            channel = channel[1:]
+        nurl = self.url + "?token={}&channel=%23{}".format(self.token, channel)
+        delay = self.rate_limiter.reserve('slackbot.say', channel)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        start = time.time()
+        async with self.session.post(nurl, data=statement.encode('utf-8')) as response:
+            body = await response.read()
+        self.metrics.record('slackbot.say', time.time() - start, len(body))
+        return response.status
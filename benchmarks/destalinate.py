@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+"""
+Time a whole destalinate run (Archiver, Warner, Announcer, Flagger) against a synthetic workspace served by
+an in-process fake Slack, reporting wall time and API calls per endpoint for each phase, and the process's
+peak RSS so far after it.
+
+    python -m benchmarks.destalinate [--scale small|medium|large] [--save-baseline] [--compare] [--tolerance 0.25]
+                                     [--trace-memory]
+
+--trace-memory also reports the peak Python memory allocated during each phase, using tracemalloc (Python 3).
+Tracing slows the run several times over, so don't compare its wall times against a baseline taken without it.
+
+Baselines are stored as benchmarks/baselines/<scale>.json.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import mock
+
+import announcer
+import archiver
+from config import get_config
+import flagger
+import slackbot
+import slacker
+import warner
+import workspace
+from benchmarks.synthetic import SCALES, SyntheticWorkspace
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def process_peak_rss_mb():
+    """Return the peak RSS of the whole process so far: it only grows, so a phase's figure includes earlier ones."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def build_workspace(scale, now):
+    config = get_config()
+    synthetic = SyntheticWorkspace(now=now, special_channels=(config.control_channel, config.announce_channel,
+                                                              config.general_message_channel),
+                                   **SCALES[scale])
+    output = [c for c in synthetic.channels if c['name'] == config.announce_channel][0]
+    synthetic.add_messages(config.control_channel, [
+        {'type': 'message', 'user': synthetic.users[0]['id'], 'ts': '{}.000001'.format(now - 86400 * 7),
+         'text': 'flag content rule saver >=3 :floppy_disk: <#{}|{}>'.format(output['id'], output['name'])},
+    ])
+    return synthetic
+
+
+def run(scale, trace_memory=False):
+    """
+    Return {phase: {'wall_seconds', 'api_calls', 'process_peak_rss_mb'}} for one run at `scale`, plus
+    'peak_traced_mb' with `trace_memory`.
+    """
+    now = int(time.time())
+    synthetic = build_workspace(scale, now)
+    server = FakeSlack(channels=synthetic.channels, users=synthetic.users, messages=synthetic.messages,
+                       emoji={'save': 'alias:floppy_disk'}).start()
+    unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+    results = collections.OrderedDict()
+
+    def phase(name, function):
+        calls_before = len(server.calls)
+        if trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                # before Python 3.9 only clearing the traces resets the peak; it then counts new allocations only
+                tracemalloc.clear_traces()
+        start = time.time()
+        function()
+        wall = time.time() - start
+        api_calls = collections.Counter(method for method, _ in server.calls[calls_before:])
+        results[name] = {'wall_seconds': round(wall, 3), 'api_calls': dict(api_calls),
+                         'process_peak_rss_mb': round(process_peak_rss_mb(), 1)}
+        if trace_memory:
+            results[name]['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 1)
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true', 'DESTALINATOR_CHANNEL_WORKERS': '8'}):
+            get_config().reload()
+            sb = slackbot.Slackbot('benchmark', 'token', rate_limiter=unlimited)
+            sb.url = server.slackbot_url
+            sl = slacker.Slacker('benchmark', 'token', init=False, rate_limiter=unlimited)
+            sl.url = server.api_url
+
+            def bootstrap():
+                sl.get_users()
+                sl.get_channels()
+                results['workspace'] = workspace.Workspace(slackbot_injected=sb, slacker_injected=sl)
+
+            phase('bootstrap', bootstrap)
+            ws = results.pop('workspace')
+            phase('archive', archiver.Archiver(workspace_injected=ws).archive)
+            phase('warn', warner.Warner(workspace_injected=ws).warn)
+            phase('announce', announcer.Announcer(workspace_injected=ws).announce)
+            phase('flag', flagger.Flagger(workspace_injected=ws).flag)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        server.stop()
+        get_config().reload()
+
+    return {'scale': scale, 'channels': len(synthetic.channels), 'users': len(synthetic.users),
+            'messages': synthetic.message_count, 'phases': results}
+
+
+def report(result, baseline=None):
+    print("{scale}: {channels} channels, {users} users, {messages} messages".format(**result))
+    print("{:<10} {:>10} {:>10} {:>16} {:>15}  {}".format(
+        "phase", "wall (s)", "baseline", "process RSS MB", "phase peak MB", "API calls"))
+    for name, numbers in result['phases'].items():
+        base = (baseline or {}).get('phases', {}).get(name, {}).get('wall_seconds')
+        traced = numbers.get('peak_traced_mb')
+        calls = ", ".join("{}={}".format(k, v) for k, v in sorted(numbers['api_calls'].items()))
+        print("{:<10} {:>10.3f} {:>10} {:>16.1f} {:>15}  {}".format(
+            name, numbers['wall_seconds'], "-" if base is None else "{:.3f}".format(base),
+            numbers['process_peak_rss_mb'], "-" if traced is None else "{:.1f}".format(traced), calls))
+
+
+def regressions(result, baseline, tolerance):
+    """Return a description of every phase slower than its baseline by more than `tolerance`, or making more calls."""
+    found = []
+    for name, numbers in result['phases'].items():
+        base = baseline['phases'].get(name)
+        if base is None:
+            continue
+        if numbers['wall_seconds'] > base['wall_seconds'] * (1 + tolerance) + 0.05:
+            found.append("{} took {:.3f}s (baseline {:.3f}s)".format(name, numbers['wall_seconds'], base['wall_seconds']))
+        for method, count in numbers['api_calls'].items():
+            if count > base['api_calls'].get(method, 0):
+                found.append("{} made {} {} calls (baseline {})".format(name, count, method, base['api_calls'].get(method, 0)))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a destalinate run against a synthetic workspace.')
+    parser.add_argument("--scale", choices=sorted(SCALES), default='small')
+    parser.add_argument("--save-baseline", action="store_true", default=False)
+    parser.add_argument("--compare", action="store_true", default=False,
+                        help="Exit non-zero if any phase regressed against the stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="Report each phase's peak Python allocations (slows the run several times over)")
+    args = parser.parse_args()
+    if args.trace_memory and tracemalloc is None:
+        parser.error("--trace-memory needs tracemalloc (Python 3.4+)")
+    if args.trace_memory and args.save_baseline:
+        parser.error("--trace-memory slows the run, so its wall times can't be saved as a baseline")
+
+    logging.basicConfig(level=logging.WARNING)
+    baseline_path = os.path.join(BASELINE_DIRECTORY, args.scale + '.json')
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    result = run(args.scale, trace_memory=args.trace_memory)
+    report(result, baseline)
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        if baseline is None:
+            sys.exit("No baseline stored at {}".format(baseline_path))
+        found = regressions(result, baseline, args.tolerance)
+        for regression in found:
+            print("REGRESSION: " + regression)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+"""
+Time Flagger rule matching over a synthetic day of messages: the FlagRules index against a scan of every rule.
+
+    python -m benchmarks.flagger_rules [--messages N] [--rules N] [--emoji N] [--repeat N]
+"""
+
+import argparse
+import operator
+import random
+import timeit
+
+from flag_rules import FlagRules
+
+OPERATORS = {'>': operator.gt, '<': operator.lt, '==': operator.eq, '>=': operator.ge, '<=': operator.le}
+
+
+def synthetic_workspace(message_count, rule_count, emoji_count, seed=0):
+    """Return (control, emoji_equivalents, messages), with every fourth emoji aliased to another."""
+    rng = random.Random(seed)
+    emoji = ["emoji{}".format(i) for i in range(emoji_count)]
+    equivalents = {}
+    for name in emoji[::4]:
+        alias = name + "_alias"
+        equivalents.setdefault(name, []).append(alias)
+        equivalents.setdefault(alias, []).append(name)
+    names = emoji + list(equivalents)
+
+    control = {}
+    for i in range(rule_count):
+        control["rule{}".format(i)] = {'emoji': rng.choice(emoji), 'comparator': rng.choice(list(FlagRules.slices)),
+                                       'threshold': rng.randint(1, 10), 'output': "flagged{}".format(i % 5)}
+
+    messages = []
+    for _ in range(message_count):
+        reactions = [{'name': name, 'count': rng.randint(1, 12)} for name in rng.sample(names, rng.randint(0, 4))]
+        messages.append({'reactions': reactions})
+    return control, equivalents, messages
+
+
+def scan_destinations(control, emoji_equivalents, reactions):
+    """Rule matching as done before FlagRules: total every reaction's equivalents, then test each rule against each total."""
+    emoji_set = set(x['emoji'] for x in control.values())
+    current_reactions = {}
+    for reaction in reactions:
+        equivalents = list(emoji_equivalents.get(reaction['name'], [])) + [reaction['name']]
+        if not emoji_set.intersection(equivalents):
+            continue
+        for ce in equivalents:
+            current_reactions[ce] = current_reactions.get(ce, 0) + reaction['count']
+    channels = []
+    for rule in control.values():
+        for ce in current_reactions:
+            if ce == rule['emoji'] and OPERATORS[rule['comparator']](current_reactions[ce], rule['threshold']):
+                channels.append(rule)
+    return channels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Flagger rule matching.')
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rules", type=int, default=200)
+    parser.add_argument("--emoji", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    control, equivalents, messages = synthetic_workspace(args.messages, args.rules, args.emoji)
+    rules = FlagRules(control, equivalents)
+
+    for message in messages:
+        assert rules.destinations(message['reactions']) == scan_destinations(control, equivalents, message['reactions'])
+
+    scan = min(timeit.repeat(lambda: [scan_destinations(control, equivalents, m['reactions']) for m in messages],
+                             number=1, repeat=args.repeat))
+    indexed = min(timeit.repeat(lambda: [rules.destinations(m['reactions']) for m in messages],
+                                number=1, repeat=args.repeat))
+    print("{} messages, {} rules: scan {:.3f}s, index {:.3f}s ({:.1f}x)".format(
+        args.messages, args.rules, scan, indexed, scan / indexed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Generators for synthetic Slack workspaces, served by tests.fake_slack.FakeSlack for benchmarking.
+"""
+
+import random
+
+DAY = 86400
+
+# Scale presets for `SyntheticWorkspace(**SCALES[name])`
+SCALES = {
+    'small': {'channels': 200, 'users': 1000, 'messages_per_channel': 100},
+    'medium': {'channels': 2000, 'users': 10000, 'messages_per_channel': 200},
+    'large': {'channels': 10000, 'users': 50000, 'messages_per_channel': 200},
+}
+
+# The share of messages with each subtype; the rest are ordinary messages
+DEFAULT_SUBTYPES = {'channel_join': 0.1, 'bot_message': 0.05, 'channel_topic': 0.01}
+
+DEFAULT_REACTIONS = ('thumbsup', 'tada', 'floppy_disk', 'fire', 'eyes')
+
+
+class SyntheticHistory(object):
+    """
+    The message history of every channel in a SyntheticWorkspace, generated on demand rather than held in
+    memory, so millions of messages cost nothing until they are read. Looks like FakeSlack's `messages` dict.
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+
+    def get(self, cid, default=None):
+        index = self.workspace.channel_index.get(cid)
+        if index is None:
+            return default
+        return self.workspace.channel_history(index)
+
+
+class SyntheticWorkspace(object):
+    """
+    A deterministic synthetic workspace: users, channels, and per-channel message histories.
+
+    Each channel's messages are spread over `history_days`; `stale_share` of channels went quiet more than
+    `quiet_days` ago, `new_share` were created in the last day, `reaction_share` of messages have reactions
+    and `subtypes` gives the share of each message subtype.
+    """
+
+    def __init__(self, channels, users, messages_per_channel, now, seed=0, history_days=120, quiet_days=90,
+                 stale_share=0.3, new_share=0.01, reaction_share=0.05, subtypes=None, reactions=DEFAULT_REACTIONS,
+                 special_channels=()):
+        """special_channels are extra channel names (e.g. the control channel) to create, each with no history"""
+        self.now = now
+        self.seed = seed
+        self.messages_per_channel = messages_per_channel
+        self.history_days = history_days
+        self.quiet_days = quiet_days
+        self.stale_share = stale_share
+        self.reaction_share = reaction_share
+        self.subtypes = sorted((subtypes if subtypes is not None else DEFAULT_SUBTYPES).items())
+        self.reactions = reactions
+        rng = random.Random(seed)
+
+        self.users = []
+        for i in range(users):
+            self.users.append({'id': 'U{:07d}'.format(i), 'name': 'user{}'.format(i),
+                               'is_restricted': rng.random() < 0.02, 'is_ultra_restricted': False})
+        user_ids = [user['id'] for user in self.users]
+
+        self.channels = []
+        for i in range(channels):
+            new = rng.random() < new_share
+            created = now - rng.randint(0, DAY - 1) if new else now - rng.randint(history_days, 3 * history_days) * DAY
+            self.channels.append({'id': 'C{:07d}'.format(i), 'name': 'channel-{}'.format(i), 'created': created,
+                                  'creator': rng.choice(user_ids), 'purpose': {'value': 'Synthetic channel {}'.format(i)},
+                                  'members': rng.sample(user_ids, min(5, len(user_ids)))})
+        for j, name in enumerate(special_channels):
+            self.channels.append({'id': 'C{:07d}'.format(channels + j), 'name': name, 'created': now - 365 * DAY,
+                                  'creator': user_ids[0], 'purpose': {'value': ''}, 'members': user_ids[:5]})
+        self.channel_index = {channel['id']: i for i, channel in enumerate(self.channels[:channels])}
+        self.extra_messages = {}
+        self.messages = SyntheticHistory(self)
+
+    def add_messages(self, channel_name, messages):
+        """Give a (special) channel a fixed history, e.g. control channel rules."""
+        for i, channel in enumerate(self.channels):
+            if channel['name'] == channel_name:
+                self.channel_index[channel['id']] = i
+                self.extra_messages[i] = messages
+
+    def channel_history(self, index):
+        if index in self.extra_messages:
+            return self.extra_messages[index]
+        rng = random.Random(self.seed * 1000003 + index)
+        stale = rng.random() < self.stale_share
+        newest = self.now - (self.quiet_days * DAY if stale else 0)
+        oldest = newest - self.history_days * DAY
+        user_ids = self.channels[index]['members']
+        messages = []
+        for _ in range(self.messages_per_channel):
+            message = {'type': 'message', 'user': rng.choice(user_ids), 'text': 'Hello from the benchmark',
+                       'ts': '{:.6f}'.format(rng.uniform(oldest, newest))}
+            roll = rng.random()
+            for subtype, share in self.subtypes:
+                if roll < share:
+                    message['subtype'] = subtype
+                    break
+                roll -= share
+            if rng.random() < self.reaction_share:
+                message['reactions'] = [{'name': name, 'count': rng.randint(1, 5)}
+                                        for name in rng.sample(self.reactions, rng.randint(1, 2))]
+            messages.append(message)
+        return messages
+
+    @property
+    def message_count(self):
+        return self.messages_per_channel * (len(self.channel_index) - len(self.extra_messages)) + \
+            sum(len(x) for x in self.extra_messages.values())
@@ -1,23 +1,137 @@
 #! /usr/bin/env python
 
+import contextlib
+import functools
 import os
+import threading
 import yaml
 
 from utils.with_logger import WithLogger
 
+# support Python 2 and 3's string types
+try:
+    STRING_TYPES = (str, unicode)  # noqa: F821
+except NameError:
+    STRING_TYPES = (str,)
+
+
+def text(value):
+    if value is None:
+        return ''
+    return value if isinstance(value, STRING_TYPES) else str(value)
+
+
+def boolean(value):
+    if isinstance(value, STRING_TYPES):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def integer(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def string_tuple(value):
+    if not value:
+        return ()
+    if isinstance(value, STRING_TYPES):
+        return (value,)
+    return tuple(value)
+
+
+def mapping(value):
+    return dict(value) if isinstance(value, dict) else {}
+
+
+def mappings(value):
+    if not isinstance(value, (list, tuple)):
+        return ()
+    return tuple(dict(x) for x in value if isinstance(x, dict))
+
+
+# The settings overrides in effect on each thread, as (Settings, resolve) pairs; see Config.override()
+_overrides = threading.local()
+
+
+class Settings(object):
+    """
+    An immutable, typed snapshot of the configuration: `configuration.yaml` with environment overrides applied.
+    Built once by `Config.reload()`, so reading a setting never touches the environment.
+    """
+    fields = (
+        ('activated', boolean),
+        ('activity_index_path', text),
+        ('announce_channel', text),
+        ('api_token', text),
+        ('archive_threshold', integer),
+        ('bot_avatar_url', text),
+        ('bot_name', text),
+        ('channel_info_ttl', integer),
+        ('channel_workers', integer),
+        ('control_channel', text),
+        ('directory_page_size', integer),
+        ('earliest_archive_date', text),
+        ('flagger_disabled', boolean),
+        ('flagger_events_port', integer),
+        ('flagger_scan_overlap', integer),
+        ('flagger_state_path', text),
+        ('general_message_channel', text),
+        ('history_cache_size', integer),
+        ('history_page_size', integer),
+        ('ignore_channel_patterns', string_tuple),
+        ('ignore_channels', string_tuple),
+        ('ignore_users', string_tuple),
+        ('included_subtypes', string_tuple),
+        ('log_channel', text),
+        ('log_level', text),
+        ('log_to_channel', boolean),
+        ('metrics_path', text),
+        ('outbound_workers', integer),
+        ('profile_dir', text),
+        ('rate_limits', mapping),
+        ('run_once', boolean),
+        ('sb_token', text),
+        ('schedule_hour', text),
+        ('sentry_dsn', text),
+        ('slack_name', text),
+        ('slackbot_concurrency', integer),
+        ('slack_signing_secret', text),
+        ('test_schedule', boolean),
+        ('warn_threshold', integer),
+        ('workspace_stagger', integer),
+        ('workspace_workers', integer),
+        ('workspaces', mappings),
+    )
+    __slots__ = tuple(name for name, _ in fields)
+    names = frozenset(__slots__)
+
+    def __init__(self, resolve):
+        """`resolve` returns the raw value of a setting by name, with any environment override applied."""
+        for name, convert in self.fields:
+            object.__setattr__(self, name, convert(resolve(name)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only; use Config.reload() to pick up changes")
+
 
 class Config(WithLogger):
     config_fname = "configuration.yaml"
 
     def __init__(self, config_fname=None):
-        config_fname = config_fname or self.config_fname
-        fo = open(config_fname, "r")
+        self.config_fname = config_fname or self.config_fname
+        self.reload()
+
+    def reload(self):
+        """Re-read the configuration file and environment variables, replacing the resolved settings."""
+        fo = open(self.config_fname, "r")
         blob = fo.read()
         fo.close()
         self.config = yaml.load(blob)
+        self.settings = Settings(self.resolve)
 
-    def __getattr__(self, attrname):
-
+    def resolve(self, attrname):
         upper_attrname = attrname.upper()
         envvar = os.getenv(upper_attrname)
         if envvar is not None:
@@ -29,6 +143,35 @@ class Config(WithLogger):
 
         return self.config.get(attrname, '')
 
+    def __getattr__(self, attrname):
+        # Only reached for names not set on the instance: known settings come from the resolved snapshot
+        # (this thread's override, if any), anything else is looked up on demand.
+        if attrname.startswith('__'):
+            raise AttributeError(attrname)
+        current = getattr(_overrides, 'current', None)
+        settings, resolve = current or (self.__dict__.get('settings'), self.resolve)
+        if settings is not None and attrname in Settings.names:
+            return getattr(settings, attrname)
+        return resolve(attrname)
+
+    @contextlib.contextmanager
+    def override(self, values):
+        """
+        Within this block, settings read on this thread come from `values` (setting name -> raw value) first,
+        before the environment and configuration file. Use `bind_config` to carry them into other threads.
+        """
+        current = getattr(_overrides, 'current', None)
+        fallback = current[1] if current else self.resolve
+
+        def resolve(attrname):
+            return values[attrname] if attrname in values else fallback(attrname)
+
+        _overrides.current = (Settings(resolve), resolve)
+        try:
+            yield
+        finally:
+            _overrides.current = current
+
     def get(self, attrname, fallback=None):
         return self.config.get(attrname, fallback)
 
@@ -40,6 +183,23 @@ def get_config():
     return _config
 
 
+def bind_config(function):
+    """Return `function` wrapped to run with the calling thread's settings overrides, e.g. on a worker thread."""
+    current = getattr(_overrides, 'current', None)
+    if current is None:
+        return function
+
+    @functools.wraps(function)
+    def bound(*args, **kwargs):
+        previous = getattr(_overrides, 'current', None)
+        _overrides.current = current
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _overrides.current = previous
+    return bound
+
+
 class WithConfig(object):
     @property
     def config(self):
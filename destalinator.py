@@ -5,10 +5,16 @@ import re
 import time
 import json
 
-from config import WithConfig
+from concurrent.futures import ThreadPoolExecutor
+
+from config import WithConfig, bind_config
+from ignore_rules import IgnoreRules
+from message_record import MessageRecord
 import utils
 
-from utils.with_logger import WithLogger
+from utils.action_queue import ActionQueue
+from utils.history_cache import HistoryCache
+from utils.with_logger import WithLogger, capture_logs, replay_logs
 
 # An arbitrary past date, as a default value for the earliest archive date
 PAST_DATE_STRING = '2000-01-01'
@@ -19,24 +25,30 @@ class Destalinator(WithLogger, WithConfig):
     closure_text_fname = "closure.txt"
     warning_text_fname = "warning.txt"
 
-    def __init__(self, slacker, slackbot, activated):
+    def __init__(self, slacker, slackbot, activated, cache=None, activity_index=None, now=None):
         """
         slacker is a Slacker() object
         slackbot should be an initialized slackbot.Slackbot() object
         activated is a boolean indicating whether destalinator should do dry runs or real runs
+        cache is an optional utils.history_cache.HistoryCache() of MessageRecords shared across a run
+        activity_index is an optional activity_index.ActivityIndex() remembering channel activity between runs
+        now is the time (default: the current time) that every window of history is measured back from
         """
         self.closure_text = utils.get_local_file_content(self.closure_text_fname)
         self.warning_text = utils.get_local_file_content(self.warning_text_fname)
         self.slacker = slacker
         self.slackbot = slackbot
 
-        self.config.activated = activated
+        if self.config.activated != activated:
+            self.config.activated = activated
         self.logger.debug("activated is %s", self.config.activated)
 
         self.earliest_archive_date = self.get_earliest_archive_date()
+        self.ignore_rules = IgnoreRules.from_config(self.config)
 
-        self.cache = {}
-        self.now = int(time.time())
+        self.cache = cache if cache is not None else HistoryCache(int(self.config.history_cache_size or 0))
+        self.activity_index = activity_index
+        self.now = now or int(time.time())
 
     # utility & data fetch methods
 
@@ -58,12 +70,29 @@ class Destalinator(WithLogger, WithConfig):
         age = age / 86400
         return age > days
 
-    def flush_channel_cache(self, channel_name):
-        """Flush all internal caches for this channel name."""
-        cid = self.slacker.get_channelid(channel_name)
-        if cid in self.cache:
-            self.logger.debug("Purging cache for %s", channel_name)
-            del self.cache[cid]
+    def evaluate_channels(self, evaluate):
+        """
+        Yield `(channel_name, evaluate(channel_name))` for every channel, sorted by channel name.
+        With `channel_workers` above 1, channels are evaluated in a bounded pool of threads; log output
+        from each evaluation is held back and replayed in channel order so runs stay deterministic.
+        """
+        channels = sorted(self.slacker.channels_by_name.keys())
+        workers = int(self.config.channel_workers or 1)
+        if workers <= 1:
+            for channel in channels:
+                yield channel, evaluate(channel)
+            return
+
+        def evaluate_deferred(channel):
+            with capture_logs() as records:
+                result = evaluate(channel)
+            return records, result
+
+        self.logger.debug("Evaluating %s channels with %s workers", len(channels), workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for channel, (records, result) in zip(channels, pool.map(bind_config(evaluate_deferred), channels)):
+                replay_logs(records)
+                yield channel, result
 
     def get_earliest_archive_date(self):
         """Return a datetime.date object representing the earliest archive date."""
@@ -71,35 +100,130 @@ class Destalinator(WithLogger, WithConfig):
             or PAST_DATE_STRING
         return datetime.strptime(date_string, "%Y-%m-%d").date()
 
+    def compact(self, messages):
+        """Return a MessageRecord for each message in `messages` with an included subtype."""
+        warning_text = self.add_slack_channel_markup(self.warning_text)
+        return [MessageRecord.from_message(x, warning_text) for x in messages if self.included_subtype(x)]
+
     def get_messages(self, channel_name, days):
-        """Return `days` worth of messages for channel `channel_name`. Caches messages per channel & days."""
+        """
+        Return `days` worth of messages for channel `channel_name` as MessageRecords, oldest first.
+        Only the parts of that window the history cache does not cover are fetched.
+        """
         oldest = self.now - days * 86400
         cid = self.slacker.get_channelid(channel_name)
 
-        if oldest in self.cache.get(cid, {}):
-            self.logger.debug("Returning %s cached messages for #%s over %s days", len(self.cache[cid][oldest]), channel_name, days)
-            return self.cache[cid][oldest]
+        older, cached, newer = self.cache.lookup(cid, oldest, self.now)
+        if older is None and newer is None:
+            self.logger.debug("Returning %s cached messages for #%s over %s days", len(cached), channel_name, days)
+            return cached
 
-        messages = self.slacker.get_messages_in_time_range(oldest, cid)
-        self.logger.debug("Fetched %s messages for #%s over %s days", len(messages), channel_name, days)
+        messages = self.fetch_history(cid, older) + cached + self.fetch_history(cid, newer)
+        self.logger.debug("Filtered down to %s messages based on included_subtypes: %s", len(messages), ", ".join(sorted(self.ignore_rules.included_subtypes)))
+        return messages
 
-        messages = [x for x in messages if x.get("subtype") is None or x.get("subtype") in self.config.included_subtypes]
-        self.logger.debug("Filtered down to %s messages based on included_subtypes: %s", len(messages), ", ".join(self.config.included_subtypes))
+    def fetch_history(self, cid, time_range):
+        """Return the MessageRecords for channel `cid` from `time_range` (or none without one), oldest first, and cache them."""
+        if time_range is None:
+            return []
+        oldest, latest = time_range
+        # compact each page as it streams in, so whole messages are never all held at once
+        records = self.compact(self.slacker.get_messages_in_time_range(oldest, cid, latest, lazy=True))
+        records.reverse()
+        self.cache.add(cid, oldest, latest, records)
+        return records
+
+    def iter_messages(self, channel_name, days):
+        """
+        Yield `days` worth of messages for channel `channel_name` as MessageRecords, newest first, filtered like
+        `get_messages`. Parts of the window the history cache does not cover are streamed from Slack page by page,
+        and as much of them as was read gets cached.
+        """
+        oldest = self.now - days * 86400
+        cid = self.slacker.get_channelid(channel_name)
 
-        if cid not in self.cache:
-            self.cache[cid] = {}
-        self.cache[cid][oldest] = messages
+        older, cached, newer = self.cache.lookup(cid, oldest, self.now)
+        if newer is not None:
+            for message in self.stream_history(cid, newer):
+                yield message
+        for message in reversed(cached):
+            yield message
+        if older is not None:
+            for message in self.stream_history(cid, older):
+                yield message
+
+    def stream_history(self, cid, time_range):
+        """
+        Yield the MessageRecords for channel `cid` from `time_range`, newest first. Once the caller stops,
+        everything read from the newest message down to the last one yielded is cached.
+        """
+        oldest, latest = time_range
+        warning_text = self.add_slack_channel_markup(self.warning_text)
+        records = []
+        read_to = latest
+        try:
+            for message in self.slacker.iter_messages_in_time_range(oldest, cid, latest):
+                read_to = float(message['ts'])
+                if self.included_subtype(message):
+                    record = MessageRecord.from_message(message, warning_text)
+                    records.append(record)
+                    yield record
+            read_to = oldest
+        finally:
+            records.reverse()
+            self.cache.add(cid, read_to, latest, records)
+            self.logger.debug("Cached %s streamed messages for %s", len(records), cid)
+
+    def included_subtype(self, message):
+        """Return True if `message` is typed by a human or has one of the `included_subtypes`."""
+        return self.ignore_rules.included_subtype(message)
+
+    def newest_activity(self, cid, oldest, latest=None):
+        """
+        Return the timestamp of the newest message in channel `cid` from between `oldest` and `latest` which
+        counts as activity, or None if none does. History is read newest first and only as far as needed.
+        """
+        for message in self.slacker.iter_messages_in_time_range(oldest, cid, latest):
+            if self.included_subtype(message) and self.is_activity(MessageRecord.from_message(message)):
+                return float(message['ts'])
+        return None
 
-        return messages
+    def recently_active(self, channel_name, days):
+        """
+        Return True if channel `channel_name` had activity in the last `days`, according to the activity index.
+        Only history the index has not seen yet is read: messages since the last sync, plus any older part of
+        the `days` window that no earlier run covered.
+        """
+        cid = self.slacker.get_channelid(channel_name)
+        cutoff = self.now - days * 86400
+        synced = self.activity_index.get(cid)
+        if synced is not None and synced[2] < cutoff:
+            # synced before the window opened: reading on from there would fetch history older than the window
+            synced = None
+
+        if synced is None:
+            last_activity = self.newest_activity(cid, cutoff, self.now)
+            synced_from = cutoff
+            self.logger.debug("Indexed #%s from scratch over %s days", channel_name, days)
+        else:
+            last_activity, synced_from, synced_to = synced
+            # phases of one run share `now`, so a later phase may find the index already synced up to it
+            newer = self.newest_activity(cid, synced_to, self.now) if synced_to < self.now else None
+            if newer is not None:
+                last_activity = newer
+            if (last_activity is None or last_activity < cutoff) and synced_from > cutoff:
+                older = self.newest_activity(cid, cutoff, synced_from)
+                if last_activity is None:
+                    last_activity = older
+                synced_from = cutoff
+            self.logger.debug("Synced #%s activity index since %s", channel_name, synced_to)
+
+        self.activity_index.update(cid, last_activity, synced_from, self.now)
+        return last_activity is not None and last_activity >= cutoff
 
     def ignore_channel(self, channel_name):
         """Return True if `channel_name` is a channel we should ignore based on config settings."""
-        if channel_name in self.config.ignore_channels:
-            return True
-        for pat in self.config.ignore_channel_patterns:
-            if re.search(pat, channel_name):
-                return True
-        return False
+        return self.ignore_rules.ignore_channel(channel_name)
 
     def post_marked_up_message(self, channel_name, message, **kwargs):
         self.slacker.post_message(channel_name, self.add_slack_channel_markup(message), **kwargs)
@@ -118,20 +242,23 @@ class Destalinator(WithLogger, WithConfig):
         if self.slacker.channel_has_only_restricted_members(channel_name):
             return False
 
-        messages = self.get_messages(channel_name, days)
+        if self.activity_index is not None:
+            return not self.recently_active(channel_name, days)
 
-        # return True (stale) if none of the messages match the criteria below
-        return not any(
-            # the message is not from an ignored user
-            x.get("user") not in self.config.ignore_users \
-            and x.get("username") not in self.config.ignore_users \
-            and (
-                # the message must have text that doesn't include ignored words
-                (x.get("text") and b":dolphin:" not in x.get("text").encode('utf-8', 'ignore')) \
-                or x.get("attachments")  # or the message must have attachments
-            )
-            for x in messages
-        )
+        # return True (stale) if none of the messages count as activity, reading no further than the first that does
+        return not any(self.is_activity(x) for x in self.iter_messages(channel_name, days))
+
+    def is_activity(self, message):
+        """Return True if MessageRecord `message` shows that its channel is not stale."""
+        # the message is not from an ignored user
+        if self.ignore_rules.ignore_user(message):
+            return False
+        # the message must have text that doesn't include ignored words, or have attachments
+        return message.has_text or message.has_attachments
+
+    def has_prior_warning(self, messages):
+        """Return True if MessageRecords `messages` contain a warning we posted earlier."""
+        return any(x.is_warning for x in messages)
 
     # channel actions
 
@@ -153,15 +280,18 @@ class Destalinator(WithLogger, WithConfig):
 
             self.action("Archiving channel #{}".format(channel_name))
             payload = self.slacker.archive(channel_name)
-            if payload['ok']:
-                self.logger.debug("Slack API response to archive: %s", json.dumps(payload, indent=4))
-                self.logger.info("Archived %s", channel_name)
-            else:
-                error = payload.get('error', '!! No error found in payload %s !!' % payload)
-                self.logger.error("Failed to archive %s: %s. See https://api.slack.com/methods/channels.archive for more context.", channel_name, error)
+            self.log_archive_response(channel_name, payload)
 
             return payload
 
+    def log_archive_response(self, channel_name, payload):
+        if payload['ok']:
+            self.logger.debug("Slack API response to archive: %s", json.dumps(payload, indent=4))
+            self.logger.info("Archived %s", channel_name)
+        else:
+            error = payload.get('error', '!! No error found in payload %s !!' % payload)
+            self.logger.error("Failed to archive %s: %s. See https://api.slack.com/methods/channels.archive for more context.", channel_name, error)
+
     def safe_archive(self, channel_name):
         """
         Archive channel if today's date is after `self.earliest_archive_date`
@@ -176,18 +306,47 @@ class Destalinator(WithLogger, WithConfig):
 
         today = date.today()
         if today >= self.earliest_archive_date:
-            self.archive(channel_name)
+            return self.archive(channel_name)
         else:
             self.logger.debug("Would have archived #%s but it's not yet %s", channel_name, self.earliest_archive_date)
 
     def safe_archive_all(self, days):  # TODO: No need to pass in days here
-        """Safe archive all channels stale longer than `days`."""
+        """
+        Safe archive all channels stale longer than `days`.
+        Return {channel_name: archive API response} for every channel that was up for archiving.
+        """
         self.action("Safe-archiving all channels stale for more than {} days".format(days))
-        for channel in sorted(self.slacker.channels_by_name.keys()):
-            if self.stale(channel, days):
+
+        outbound = self.outbound_queue()
+        for channel, is_stale in self.evaluate_channels(lambda channel: self.stale(channel, days)):
+            if is_stale:
                 self.logger.debug("Attempting to safe-archive #%s", channel)
-                self.safe_archive(channel)
-            self.flush_channel_cache(channel)
+                outbound.submit(channel, self.safe_archive, channel)
+        return self.collect_results(outbound, "archive")
+
+    def outbound_queue(self):
+        """
+        Return a queue for channel actions (posts and archiving), which runs up to `outbound_workers` channels'
+        actions at once while keeping each channel's in order. Each channel's posts still wait for its own
+        chat.postMessage budget in `rate_limits`.
+        """
+        return ActionQueue(int(self.config.outbound_workers or 1))
+
+    def collect_results(self, outbound, verb):
+        """
+        Wait for the actions on `outbound` and return {channel_name: result}.
+        Failures are logged per channel, and the first one is re-raised once every channel is done.
+        """
+        results = {}
+        errors = []
+        for action in outbound.drain():
+            if action.error is not None:
+                self.logger.error("Failed to %s #%s: %s", verb, action.key, action.error)
+                errors.append(action.error)
+            results[action.key] = action.value
+        if errors:
+            raise errors[0]
+        return results
 
     def warn(self, channel_name, days, force_warn=False):
         """
@@ -206,10 +365,7 @@ class Destalinator(WithLogger, WithConfig):
             return False
 
         messages = self.get_messages(channel_name, days)
-        texts = [x.get("text").strip() for x in messages if x.get("text")]
-        if (not force_warn and
-                (self.add_slack_channel_markup(self.warning_text) in texts or
-                 any(any(a.get('fallback') == 'channel_warning' for a in m.get('attachments', [])) for m in messages))):
+        if not force_warn and self.has_prior_warning(messages):
             self.logger.debug("Not warning #%s because we found a prior warning", channel_name)
             return False
 
@@ -226,15 +382,18 @@ class Destalinator(WithLogger, WithConfig):
                              "documentation on the DESTALINATOR_ACTIVATED environment variable.")
         self.action("Warning all channels stale for more than {} days".format(days))
 
-        stale = []
-        for channel in sorted(self.slacker.channels_by_name.keys()):
+        def evaluate(channel):
             if self.ignore_channel(channel):
                 self.logger.debug("Not warning #%s because it's in ignore_channels", channel)
-                continue
-            if self.stale(channel, days):
-                if self.warn(channel, days, force_warn):
-                    stale.append(channel)
-            self.flush_channel_cache(channel)
+                return None
+            return self.stale(channel, days)
+
+        outbound = self.outbound_queue()
+        for channel, is_stale in self.evaluate_channels(evaluate):
+            if is_stale:
+                outbound.submit(channel, self.warn, channel, days, force_warn)
+        results = self.collect_results(outbound, "warn")
+        stale = [channel for channel in sorted(results) if results[channel]]
 
         if stale and self.config.general_message_channel:
             self.logger.debug("Notifying #%s of warned channels", self.config.general_message_channel)
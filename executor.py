@@ -2,23 +2,29 @@
 
 from config import WithConfig
 import destalinator
-import slackbot
-import slacker
+import workspace
 
-from utils.slack_logging import set_up_slack_logger
 from utils.with_logger import WithLogger
 
 
 class Executor(WithLogger, WithConfig):
 
-    def __init__(self, slackbot_injected=None, slacker_injected=None):
-        self.slackbot = slackbot_injected or slackbot.Slackbot(self.config.slack_name, token=self.config.sb_token)
-        set_up_slack_logger(self.slackbot)
+    def __init__(self, slackbot_injected=None, slacker_injected=None, workspace_injected=None):
+        """
+        workspace_injected is a workspace.Workspace() snapshot to share with other executors;
+        without one, a fresh snapshot is built from slackbot_injected and slacker_injected.
+        """
+        self.workspace = workspace_injected or workspace.Workspace(slackbot_injected=slackbot_injected,
+                                                                   slacker_injected=slacker_injected)
+        self.slackbot = self.workspace.slackbot
 
         self.logger.debug("activated is %s", self.config.activated)
 
-        self.slacker = slacker_injected or slacker.Slacker(self.config.slack_name, token=self.config.api_token)
+        self.slacker = self.workspace.slacker
 
         self.ds = destalinator.Destalinator(slacker=self.slacker,
                                             slackbot=self.slackbot,
-                                            activated=self.config.activated)
+                                            activated=self.config.activated,
+                                            cache=self.workspace.cache,
+                                            activity_index=self.workspace.activity_index,
+                                            now=self.workspace.now)
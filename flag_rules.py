@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+
+import bisect
+import operator
+
+
+class FlagRules(object):
+    """
+    Flagger control rules compiled into an index, so a message is checked in time proportional to its reactions.
+
+    Each rule emoji maps to its rules grouped by comparator, each group sorted by threshold; a reaction total
+    is then matched against a group with a single binary search. `contributors` maps every emoji name to the
+    rule emoji whose totals a reaction with that name adds to: the emoji itself and its aliases.
+    """
+
+    # For thresholds sorted ascending, the ones a count satisfies form a contiguous slice, bounded by the
+    # count's bisect_left (`left`) and bisect_right (`right`) positions: e.g. `count >= threshold` for thresholds[:right].
+    slices = {
+        '>=': lambda left, right, size: (0, right),
+        '>': lambda left, right, size: (0, left),
+        '<=': lambda left, right, size: (left, size),
+        '<': lambda left, right, size: (right, size),
+        '==': lambda left, right, size: (left, right),
+    }
+
+    def __init__(self, control, emoji_equivalents):
+        """
+        control is Flagger's {uuid: rule} dictionary, each rule having 'emoji', 'comparator' and 'threshold'
+        emoji_equivalents is a {emoji: [alias, ...]} dictionary
+        """
+        grouped = {}
+        for ordinal, rule in enumerate(control.values()):
+            group = grouped.setdefault(rule['emoji'], {}).setdefault(rule['comparator'], [])
+            group.append((rule['threshold'], ordinal, rule))
+
+        self.index = {}
+        for emoji, comparators in grouped.items():
+            self.index[emoji] = {}
+            for comparator, group in comparators.items():
+                group.sort(key=operator.itemgetter(0, 1))
+                self.index[emoji][comparator] = ([x[0] for x in group], [(x[1], x[2]) for x in group])
+
+        self.contributors = {}
+        for emoji in self.index:
+            self.contributors.setdefault(emoji, []).append(emoji)
+            for alias in emoji_equivalents.get(emoji, []):
+                self.contributors.setdefault(alias, []).append(emoji)
+
+    def destinations(self, reactions):
+        """Return the rules matched by `reactions` (a message's 'reactions' list), in control order."""
+        totals = {}
+        for reaction in reactions:
+            for emoji in self.contributors.get(reaction['name'], ()):
+                totals[emoji] = totals.get(emoji, 0) + reaction['count']
+
+        matched = []
+        for emoji, count in totals.items():
+            for comparator, (thresholds, rules) in self.index[emoji].items():
+                start, end = self.slices[comparator](bisect.bisect_left(thresholds, count),
+                                                     bisect.bisect_right(thresholds, count),
+                                                     len(thresholds))
+                matched.extend(rules[start:end])
+        matched.sort(key=operator.itemgetter(0))
+        return [rule for _, rule in matched]
@@ -1,7 +1,6 @@
 #! /usr/bin/env python
 
 import argparse
-import copy
 import json
 import operator
 import re
@@ -17,6 +16,8 @@ except ImportError:
     HTML_UNESCAPER = HTMLParser.HTMLParser()
 
 import executor
+from flag_rules import FlagRules
+from flagger_events import EventsApiSource, ReactionTallies
 
 
 class Flagger(executor.Executor):
@@ -26,6 +27,7 @@ class Flagger(executor.Executor):
 
     def __init__(self, *args, **kwargs):
         self.debug = kwargs.pop('debug', False)
+        self.rebuild_control = kwargs.pop('rebuild_control', False)
         super(self.__class__, self).__init__(*args, **kwargs)
         self.now = int(time.time())
 
@@ -54,51 +56,69 @@ class Flagger(executor.Executor):
     def initialize_control(self):
         """
         sets up known control configuration based on control channel messages
+
+        With a workspace `flagger_state`, the rules are saved along with the last control message applied,
+        and later runs only fetch and apply control messages newer than that, unless `rebuild_control` is set.
         """
         channel = self.config.control_channel
         if not self.slacker.channel_exists(channel):
             self.logger.warning("Flagger control channel does not exist, cannot run. Please create #%s.", channel)
             return False
         cid = self.slacker.get_channelid(channel)
-        messages = self.slacker.get_messages_in_time_range(0, cid, self.now)
-        control = {}
+        state = self.workspace.flagger_state
+        saved = None
+        if state is not None and not self.rebuild_control:
+            saved = state.get_control(cid)
+        if saved is None:
+            control, last_ts = {}, 0
+        else:
+            control, last_ts = saved
+            self.logger.debug("Applying control messages after %s to %s saved rules", last_ts, len(control))
+        messages = self.slacker.get_messages_in_time_range(last_ts, cid, self.now)
         for message in messages:
-            text = message['text']
-            tokens = text.split()
-            if tokens[0:3] != ['flag', 'content', 'rule']:
-                continue
-            if len(tokens) < 5:
-                self.logger.warning("Control message %s has too few tokens", text)
-                continue
-            if len(tokens) == 5 and tokens[4] == 'delete':
-                uuid = tokens[3]
-                if uuid in control:
-                    del(control[uuid])
-                    self.logger.debug("Message %s deletes UUID %s", text, uuid)
-                    continue
-            try:
-                tokens = text.split()
-                uuid = tokens[3]
-                comparator, threshold = self.extract_threshold(tokens[4])
-                emoji = tokens[5].replace(":", "")
-                output_channel_id = re.sub("[<>]", "", tokens[6])
-                if output_channel_id.find("|") != -1:
-                    cid, cname = output_channel_id.split("|")
-                    output_channel_id = cid
-                output_channel_name = self.slacker.replace_id(output_channel_id)
-                control[uuid] = {'threshold': threshold, "comparator": comparator,
-                                 'emoji': emoji, 'output': output_channel_name}
-            except Exception as e:
-                tb = traceback.format_exc()
-                m = "Couldn't create flagger rule with text {}: {} {}".format(text, Exception, e)
-                self.logger.warning(m)
-                self.logger.debug(tb)
+            self.apply_control_message(control, message['text'])
+            last_ts = message['ts']
+        if state is not None:
+            state.set_control(cid, control, last_ts)
         self.control = control
         self.logger.debug("control: %s", json.dumps(self.control, indent=4))
-        self.emoji = [x['emoji'] for x in self.control.values()]
         self.initialize_emoji_aliases()
         return True
 
+    def apply_control_message(self, control, text):
+        """
+        applies the control message `text` to the `control` rules:
+        adds or replaces a rule, deletes one, or does nothing if `text` is not a valid rule
+        """
+        tokens = text.split()
+        if tokens[0:3] != ['flag', 'content', 'rule']:
+            return
+        if len(tokens) < 5:
+            self.logger.warning("Control message %s has too few tokens", text)
+            return
+        if len(tokens) == 5 and tokens[4] == 'delete':
+            uuid = tokens[3]
+            if uuid in control:
+                del(control[uuid])
+                self.logger.debug("Message %s deletes UUID %s", text, uuid)
+                return
+        try:
+            uuid = tokens[3]
+            comparator, threshold = self.extract_threshold(tokens[4])
+            emoji = tokens[5].replace(":", "")
+            output_channel_id = re.sub("[<>]", "", tokens[6])
+            if output_channel_id.find("|") != -1:
+                cid, cname = output_channel_id.split("|")
+                output_channel_id = cid
+            output_channel_name = self.slacker.replace_id(output_channel_id)
+            control[uuid] = {'threshold': threshold, "comparator": comparator,
+                             'emoji': emoji, 'output': output_channel_name}
+        except Exception as e:
+            tb = traceback.format_exc()
+            m = "Couldn't create flagger rule with text {}: {} {}".format(text, Exception, e)
+            self.logger.warning(m)
+            self.logger.debug(tb)
+
     def initialize_emoji_aliases(self):
         """
         In some cases, emojiA might be an alias of emojiB
@@ -131,90 +151,95 @@ class Flagger(executor.Executor):
         self.logger.debug("equivalents: %s", json.dumps(self.emoji_equivalents, indent=4))
         if "floppy_disk" in self.emoji_equivalents.keys():
             self.logger.debug("floppy_disk: %s", self.emoji_equivalents['floppy_disk'])
+        self.rules = FlagRules(self.control, self.emoji_equivalents)
 
     def message_destination(self, message):
         """
         if interesting, returns channel name[s] in which to announce
         otherwise, returns []
         """
-        channels = []
-        if message.get("reactions") is None:
-            return False
         reactions = message.get("reactions")
-        emoji_set = set(self.emoji)
-        current_reactions = {}
-        self.logger.debug("reactions: %s", reactions)
-        self.logger.debug("emoji_equivalents:\n%s", json.dumps(self.emoji_equivalents, indent=4))
-        if "floppy_disk" in self.emoji_equivalents.keys():
-            self.logger.debug("floppy_disk: %s", self.emoji_equivalents['floppy_disk'])
-        for reaction in reactions:
-            count = reaction['count']
-            current_emoji = reaction['name']
-            self.logger.debug("current_emoji: %s", current_emoji)
-            equivalents = copy.copy(self.emoji_equivalents.get(current_emoji, []))
-            self.logger.debug("equivalents: %s", equivalents)
-            equivalents.append(current_emoji)
-            self.logger.debug("equivalents: %s", equivalents)
-            current_set = set(equivalents)
-            i = current_set.intersection(emoji_set)
-            if not i:
-                continue
-            for ce in equivalents:
-                current_reactions[ce] = current_reactions.get(ce, 0) + count
-            # if we're here, at least one emoji matches (but count may still not be right)
-        self.logger.debug("Current reactions: {}".format(current_reactions))
-        for uuid in self.control:
-            rule = self.control[uuid]
-            for ce in current_reactions:
-                if ce == rule['emoji']:
-                    count = current_reactions[ce]
-                    threshold = rule['threshold']
-                    comparator = rule['comparator']
-                    op = self.operators[comparator]
-                    if op(count, threshold):
-                        channels.append(rule)
-        return channels
+        if reactions is None:
+            return False
+        return self.rules.destinations(reactions)
+
+    def scan_start(self, cid, dayago):
+        """
+        returns the time from which to scan channel `cid`: a day ago, or `flagger_scan_overlap` seconds
+        before the previous scan ended if that is later, so reactions added since then are still seen
+        """
+        state = self.workspace.flagger_state
+        scanned_to = state.get_checkpoint(cid) if state is not None else None
+        if scanned_to is None:
+            return dayago
+        return max(dayago, scanned_to - int(self.config.flagger_scan_overlap or 0))
 
     def get_interesting_messages(self):
         """
         returns [[message, [listofchannelstoannounce]]
         """
         dayago = self.now - 86400
+        state = self.workspace.flagger_state
 
         messages = []
         for channel in self.slacker.channels_by_name:
             cid = self.slacker.get_channelid(channel)
-            cur_messages = self.slacker.get_messages_in_time_range(dayago, cid, self.now)
+            cur_messages = self.slacker.get_messages_in_time_range(self.scan_start(cid, dayago), cid, self.now, lazy=True)
+            matched = []
             for message in cur_messages:
                 announce = self.message_destination(message)
+                if announce and state is not None:
+                    announce = [x for x in announce if not state.was_announced(cid, message["ts"], x["output"])]
                 if announce:
-                    messages.append([message, announce])
+                    matched.append([message, announce])
+            # history streams newest first; announce each channel's messages in the order they were posted
+            matched.reverse()
+            messages.extend(matched)
         return messages
 
     def announce_interesting_messages(self):
         messages = self.get_interesting_messages()
         for message, channels in messages:
-            ts = message["ts"].replace(".", "")
-            channel = message["channel"]
-            author = message["user"]
-            author_name = self.slacker.users_by_id[author]
-            text = self.slacker.asciify(message["text"])
-            text = self.slacker.detokenize(text)
-            url = "http://{}.slack.com/archives/{}/p{}".format(self.config.slack_name, channel, ts)
-            m = "*@{}* said in *#{}* _'{}'_ ({})".format(author_name, channel, text, url)
-            for output_channel in channels:
-                if self.slacker.channel_exists(output_channel["output"]):
-                    md = "Saying {} to {}".format(m, output_channel["output"])
-                    self.logger.debug(md)
-                    if not self.debug and self.config.activated:  # TODO: rename debug to dry run?
-                        self.slackbot.say(output_channel["output"], m)
-                else:
-                    self.logger.warning("Attempted to announce in %s because of rule :%s:%s%s, but channel does not exist.".format(
-                        output_channel["output"],
-                        output_channel["emoji"],
-                        output_channel["comparator"],
-                        output_channel["threshold"]
-                    ))
+            self.announce(message, channels)
+        state = self.workspace.flagger_state
+        if state is not None and self.live:
+            state.set_checkpoints({cid: self.now for cid in self.slacker.channels_by_id})
+            state.prune_announced(self.now - 86400)
+
+    @property
+    def live(self):
+        return not self.debug and self.config.activated  # TODO: rename debug to dry run?
+
+    def announce(self, message, channels):
+        """
+        announces `message` in the output channel of each of the rules in `channels`,
+        recording it in the workspace `flagger_state`, if any
+        """
+        state = self.workspace.flagger_state if self.live else None
+        ts = message["ts"].replace(".", "")
+        channel = message["channel"]
+        # bot messages have no `user`, only a `username` or `bot_id`
+        author = message.get("user")
+        author_name = self.slacker.users_by_id.get(author) or message.get("username") or message.get("bot_id")
+        text = self.slacker.asciify(message.get("text") or "")
+        text = self.slacker.detokenize(text)
+        url = "http://{}.slack.com/archives/{}/p{}".format(self.config.slack_name, channel, ts)
+        m = "*@{}* said in *#{}* _'{}'_ ({})".format(author_name, channel, text, url)
+        for output_channel in channels:
+            if self.slacker.channel_exists(output_channel["output"]):
+                md = "Saying {} to {}".format(m, output_channel["output"])
+                self.logger.debug(md)
+                if self.live:
+                    self.slackbot.say(output_channel["output"], m)
+                    if state is not None:
+                        state.record_announced(self.slacker.get_channelid(channel), message["ts"], output_channel["output"])
+            else:
+                self.logger.warning("Attempted to announce in %s because of rule :%s:%s%s, but channel does not exist.".format(
+                    output_channel["output"],
+                    output_channel["emoji"],
+                    output_channel["comparator"],
+                    output_channel["threshold"]
+                ))
 
     def flag(self):
         if self.config.flagger_disabled:
@@ -224,10 +249,79 @@ class Flagger(executor.Executor):
         if self.initialize_control():
             self.announce_interesting_messages()
 
+    def listen(self, source):
+        """
+        Announce messages as they are reacted to, instead of scanning every channel's history.
+        `source` is a flagger_events.EventSource() delivering `reaction_added`, `reaction_removed` and
+        `message` events; new control channel messages are applied to the rules as they arrive.
+        """
+        if self.config.flagger_disabled:
+            self.logger.info("Not Flagging... Flagger disabled")
+            return
+        if not self.initialize_control():
+            return
+        self.logger.info("Flagging from events")
+        control_cid = self.slacker.get_channelid(self.config.control_channel)
+        tallies = ReactionTallies()
+        for event in source.iter_events():
+            self.now = int(time.time())
+            tallies.evict(self.now)
+            try:
+                self.handle_event(tallies, control_cid, event)
+            except Exception:  # pylint: disable=W0703
+                # one bad event or failed lookup mustn't stop the listener
+                self.logger.exception("Couldn't handle %s event", event.get("type"))
+
+    def handle_event(self, tallies, control_cid, event):
+        event_type = event.get("type")
+        if event_type == "message" and event.get("channel") == control_cid and "subtype" not in event:
+            self.apply_control_message(self.control, event.get("text", ""))
+            self.rules = FlagRules(self.control, self.emoji_equivalents)
+            if self.workspace.flagger_state is not None:
+                self.workspace.flagger_state.set_control(control_cid, self.control, event["ts"])
+        elif event_type in ("reaction_added", "reaction_removed") and event["item"].get("type") == "message":
+            self.handle_reaction(tallies, event)
+
+    def handle_reaction(self, tallies, event):
+        cid, ts = event["item"]["channel"], event["item"]["ts"]
+        if cid not in self.slacker.channels_by_id or float(ts) < self.now - tallies.ttl:
+            return
+        key = (cid, ts)
+        message = tallies.get(key)
+        if message is None:
+            # the first reaction seen on a message: fetch its current reactions, which include this one
+            message = self.slacker.get_reacted_message(cid, ts)
+            if message is None:
+                return
+            tallies.add(key, message)
+        else:
+            tallies.react(key, event["reaction"], 1 if event["type"] == "reaction_added" else -1)
+
+        state = self.workspace.flagger_state
+        announced = tallies.announced[key]
+        channels = [x for x in self.message_destination(message) or [] if x["output"] not in announced]
+        if channels and state is not None:
+            channels = [x for x in channels if not state.was_announced(cid, ts, x["output"])]
+        if channels:
+            self.announce(message, channels)
+            announced.update(x["output"] for x in channels)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Flag interesting Slack messages.')
     parser.add_argument("--debug", action="store_true", default=False)
+    parser.add_argument("--rebuild-control", action="store_true", default=False,
+                        help="Replay the whole control channel instead of only messages since the last run")
+    parser.add_argument("--listen", action="store_true", default=False,
+                        help="Keep running, flagging messages from Slack Events API reactions instead of scanning history")
     args = parser.parse_args()
 
-    Flagger(debug=args.debug).flag()
+    f = Flagger(debug=args.debug, rebuild_control=args.rebuild_control)
+    if args.listen:
+        events = EventsApiSource(f.config.flagger_events_port, signing_secret=f.config.slack_signing_secret)
+        try:
+            f.listen(events)
+        finally:
+            events.close()
+    else:
+        f.flag()
@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+"""
+Sources of Slack events for Flagger's long-running mode (`Flagger.listen`), and the reaction tallies it keeps.
+"""
+
+import abc
+import collections
+import hashlib
+import heapq
+import hmac
+import json
+import threading
+import time
+
+# support Python 2 and 3's versions of these modules
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    import queue
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    import Queue as queue
+
+from utils.with_logger import WithLogger
+
+
+class EventSource(abc.ABCMeta('ABC', (object,), {})):
+    """Something Flagger.listen() can consume Slack events from, e.g. the Events API or a recorded stream."""
+
+    @abc.abstractmethod
+    def iter_events(self):
+        """Yield Slack event objects (the `event` of an Events API callback) as they arrive."""
+
+    def close(self):
+        pass
+
+
+class IterableEventSource(EventSource):
+    """Replays a fixed sequence of events, e.g. to drive tests and benchmarks."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def iter_events(self):
+        return iter(self.events)
+
+
+class EventsApiSource(EventSource, WithLogger):
+    """
+    Receives events posted by the Slack Events API to an HTTP endpoint on `port`.
+
+    Answers Slack's `url_verification` challenge, and, given the app's `signing_secret`,
+    rejects requests without a valid, recent `X-Slack-Signature`. Slack redelivers an event it thinks
+    wasn't received; events whose `event_id` is among the last `max_seen_events` queued are dropped.
+    """
+
+    max_request_age = 300
+    max_seen_events = 1000
+
+    def __init__(self, port, signing_secret=None, host=''):
+        self.signing_secret = signing_secret
+        self.events = queue.Queue()
+        self.seen_event_ids = set()
+        self.seen_order = collections.deque()
+        source = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                status, body = source.receive(self.rfile.read(length), self.headers)
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = HTTPServer((host, port), Handler)
+        self.thread = None
+
+    def iter_events(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.server.serve_forever)
+            self.thread.daemon = True
+            self.thread.start()
+        while True:
+            yield self.events.get()
+
+    def close(self):
+        if self.thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+
+    def verified(self, body, headers):
+        if not self.signing_secret:
+            return True
+        timestamp = headers.get('X-Slack-Request-Timestamp') or '0'
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > self.max_request_age:
+            return False
+        base = b'v0:' + timestamp.encode('utf-8') + b':' + body
+        expected = 'v0=' + hmac.new(self.signing_secret.encode('utf-8'), base, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, headers.get('X-Slack-Signature') or '')
+
+    def receive(self, body, headers):
+        """Handle one Events API request, returning `(status, response body)`."""
+        if not self.verified(body, headers):
+            self.logger.warning("Rejecting an Events API request with a bad signature")
+            return 401, ''
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400, ''
+        if payload.get('type') == 'url_verification':
+            return 200, payload.get('challenge', '')
+        if payload.get('type') == 'event_callback' and self.first_delivery(payload.get('event_id'), headers):
+            self.events.put(payload['event'])
+        return 200, ''
+
+    def first_delivery(self, event_id, headers):
+        """Remember `event_id`, returning False if it was already delivered."""
+        if event_id is None:
+            return True
+        if event_id in self.seen_event_ids:
+            self.logger.debug("Dropping redelivered event %s (retry %s)", event_id, headers.get('X-Slack-Retry-Num'))
+            return False
+        self.seen_event_ids.add(event_id)
+        self.seen_order.append(event_id)
+        if len(self.seen_order) > self.max_seen_events:
+            self.seen_event_ids.discard(self.seen_order.popleft())
+        return True
+
+
+class ReactionTallies(object):
+    """
+    Messages that have been reacted to, with their current reactions, keyed by `(channel_id, ts)`.
+
+    Messages are forgotten once they are more than `ttl` seconds old, along with where they were announced.
+    """
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self.messages = {}
+        self.announced = {}
+        self.expiry = []
+
+    def get(self, key):
+        return self.messages.get(key)
+
+    def add(self, key, message):
+        """Start tallying `message`, whose 'reactions' are current."""
+        message.setdefault('reactions', [])
+        self.messages[key] = message
+        self.announced[key] = set()
+        heapq.heappush(self.expiry, (float(key[1]), key))
+
+    def react(self, key, name, delta):
+        """Add `delta` (1 or -1) to the count of the `name` reaction on message `key`."""
+        reactions = self.messages[key]['reactions']
+        for reaction in reactions:
+            if reaction['name'] == name:
+                reaction['count'] += delta
+                if reaction['count'] <= 0:
+                    reactions.remove(reaction)
+                return
+        if delta > 0:
+            reactions.append({'name': name, 'count': delta})
+
+    def evict(self, now):
+        while self.expiry and self.expiry[0][0] < now - self.ttl:
+            _, key = heapq.heappop(self.expiry)
+            self.messages.pop(key, None)
+            self.announced.pop(key, None)
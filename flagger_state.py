@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+
+import json
+import sqlite3
+import threading
+
+from utils.with_logger import WithLogger
+
+
+class FlaggerState(WithLogger):
+    """
+    An on-disk (SQLite) record of what Flagger has already worked out, so later runs can pick up where it left off.
+
+    Per control channel ID it keeps the compiled rules and the timestamp of the last control message applied to them.
+    Per channel ID it keeps how far messages have been scanned for flagging (`scanned_to`), and a ledger of
+    the messages already announced, by message timestamp and output channel.
+    """
+
+    def __init__(self, path):
+        """path is the SQLite database file (":memory:" for throwaway state)"""
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS control_rules (channel_id TEXT PRIMARY KEY, rules TEXT, last_ts TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS scan_checkpoints (channel_id TEXT PRIMARY KEY, scanned_to REAL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS announced ("
+                "channel_id TEXT, ts TEXT, output TEXT, ts_value REAL, PRIMARY KEY (channel_id, ts, output))"
+            )
+
+    def get_control(self, cid):
+        """Return `(rules, last_ts)` saved for control channel `cid`, or None if nothing has been saved."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT rules, last_ts FROM control_rules WHERE channel_id = ?", (cid,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set_control(self, cid, rules, last_ts):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO control_rules (channel_id, rules, last_ts) VALUES (?, ?, ?)",
+                (cid, json.dumps(rules), last_ts)
+            )
+
+    def get_checkpoint(self, cid):
+        """Return the time up to which channel `cid` has been scanned, or None if it never has."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT scanned_to FROM scan_checkpoints WHERE channel_id = ?", (cid,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set_checkpoints(self, scanned_to):
+        """`scanned_to` is a {channel_id: time} dictionary"""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scan_checkpoints (channel_id, scanned_to) VALUES (?, ?)",
+                scanned_to.items()
+            )
+
+    def was_announced(self, cid, ts, output):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM announced WHERE channel_id = ? AND ts = ? AND output = ?", (cid, ts, output)
+            ).fetchone()
+        return row is not None
+
+    def record_announced(self, cid, ts, output):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO announced (channel_id, ts, output, ts_value) VALUES (?, ?, ?, ?)",
+                (cid, ts, output, float(ts))
+            )
+
+    def prune_announced(self, before):
+        """Forget announced messages posted before `before`, which are too old to be scanned again."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM announced WHERE ts_value < ?", (before,))
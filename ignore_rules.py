@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+
+import re
+
+from config import string_tuple
+
+
+class IgnoreRules(object):
+    """
+    The `ignore_channels`, `ignore_channel_patterns`, `ignore_users` and `included_subtypes` settings,
+    compiled once into frozensets and regular expressions for the per-channel and per-message checks.
+    """
+
+    def __init__(self, ignore_channels=None, ignore_channel_patterns=None, ignore_users=None, included_subtypes=None):
+        self.ignore_channels = frozenset(string_tuple(ignore_channels))
+        # compiled separately, so each pattern's inline flags and backreferences keep their meaning
+        self.ignore_channel_patterns = tuple(re.compile(p) for p in string_tuple(ignore_channel_patterns))
+        self.ignore_users = frozenset(string_tuple(ignore_users))
+        self.included_subtypes = frozenset(string_tuple(included_subtypes))
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(ignore_channels=config.ignore_channels,
+                   ignore_channel_patterns=config.ignore_channel_patterns,
+                   ignore_users=config.ignore_users,
+                   included_subtypes=config.included_subtypes)
+
+    def ignore_channel(self, channel_name):
+        """Return True if `channel_name` is listed in `ignore_channels` or matches any `ignore_channel_patterns`."""
+        if channel_name in self.ignore_channels:
+            return True
+        return any(p.search(channel_name) for p in self.ignore_channel_patterns)
+
+    def ignore_user(self, message):
+        """Return True if `message` comes from one of the `ignore_users`, by user ID or username."""
+        return message.get("user") in self.ignore_users or message.get("username") in self.ignore_users
+
+    def included_subtype(self, message):
+        """Return True if `message` is typed by a human or has one of the `included_subtypes`."""
+        subtype = message.get("subtype")
+        return subtype is None or subtype in self.included_subtypes
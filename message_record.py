@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+
+
+class MessageRecord(object):
+    """
+    The parts of a Slack message that staleness and warning checks read, kept in the history cache in place of
+    the whole message (attachments, edits, reactions and so on), which is many times larger.
+    """
+
+    __slots__ = ('ts', 'user', 'username', 'subtype', 'has_text', 'has_attachments', 'is_warning')
+
+    def __init__(self, ts=None, user=None, username=None, subtype=None, has_text=False, has_attachments=False,
+                 is_warning=False):
+        self.ts = ts
+        self.user = user
+        self.username = username
+        self.subtype = subtype
+        self.has_text = has_text
+        self.has_attachments = has_attachments
+        self.is_warning = is_warning
+
+    @classmethod
+    def from_message(cls, message, warning_text=None):
+        """
+        Compact a Slack `message`. `has_text` is set if it has text that doesn't include ignored words, and
+        `is_warning` if it is a warning we posted: its text is `warning_text`, or it carries our warning marker.
+        """
+        text = message.get('text')
+        attachments = message.get('attachments') or []
+        ts = message.get('ts')
+        is_warning = any(a.get('fallback') == 'channel_warning' for a in attachments)
+        if text and warning_text is not None and text.strip() == warning_text:
+            is_warning = True
+        return cls(ts=float(ts) if ts is not None else None,
+                   user=message.get('user'),
+                   username=message.get('username'),
+                   subtype=message.get('subtype'),
+                   has_text=bool(text) and b":dolphin:" not in text.encode('utf-8', 'ignore'),
+                   has_attachments=bool(attachments),
+                   is_warning=is_warning)
+
+    def get(self, key, default=None):
+        """Read a field the way a message dict would be read, so IgnoreRules can check records too."""
+        value = getattr(self, key) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return "MessageRecord(ts={!r}, user={!r}, subtype={!r})".format(self.ts, self.user, self.subtype)
@@ -1,5 +1,9 @@
+import argparse
 import logging
+import os
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from raven.base import Client as RavenClient
 
@@ -7,10 +11,16 @@ import warner
 import archiver
 import announcer
 import flagger
-from config import get_config
+import workspace
+from config import STRING_TYPES, get_config
+from utils.phase_profiler import PhaseProfiler
+from utils.slack_logging import flush_slack_logger
 
+# Files each run writes to; with several workspaces, each gets its own unless its entry names one
+WORKSPACE_PATHS = ('activity_index_path', 'flagger_state_path', 'metrics_path')
 
-def schedule_job():
+
+def schedule_job(profile_dir=None):
     # When testing changes, set the "TEST_SCHEDULE" envvar to run more often
     if get_config().test_schedule:
         schedule_kwargs = {"hour": "*", "minute": "*/10"}
@@ -18,43 +28,125 @@ def schedule_job():
         schedule_kwargs = {"hour": get_config().schedule_hour}
 
     sched = BlockingScheduler()
-    sched.add_job(destalinate_job, "cron", **schedule_kwargs)
+    sched.add_job(destalinate_all, "cron", kwargs={"profile_dir": profile_dir}, **schedule_kwargs)
     sched.start()
 
 
 def destalinate_lambda(event, context):
-    destalinate_job()
+    # an event can also ask for a profiled run, e.g. {"profile_dir": "/tmp/profiles"}
+    profile_dir = event.get('profile_dir') if isinstance(event, dict) else None
+    destalinate_all(profile_dir=profile_dir)
+
+
+def workspace_overrides():
+    """
+    Return the settings of each workspace to destalinate: one dict per `workspaces` entry, with environment
+    variables in its values expanded, or a single empty dict (the top-level settings) if there are none.
+    Top-level `WORKSPACE_PATHS` an entry doesn't set get its `slack_name` added, e.g. metrics-acme.prom.
+    """
+    config = get_config()
+    overrides = []
+    for entry in config.workspaces:
+        values = {k: os.path.expandvars(v) if isinstance(v, STRING_TYPES) else v for k, v in entry.items()}
+        # a single log handler serves the whole process, so no workspace's logs may go to another's channel
+        values['log_to_channel'] = False
+        for setting in WORKSPACE_PATHS:
+            path = getattr(config, setting)
+            if path and setting not in values:
+                base, extension = os.path.splitext(path)
+                values[setting] = "{}-{}{}".format(base, values.get('slack_name', config.slack_name), extension)
+        overrides.append(values)
+    return overrides or [{}]
+
+
+def destalinate_all(profile_dir=None):
+    """
+    Destalinate every workspace. Workspaces share a pool of `workspace_workers` threads and start
+    `workspace_stagger` seconds apart; each keeps its own rate-limit budgets, and a failure in one
+    doesn't stop the others.
+    """
+    overrides = workspace_overrides()
+    if overrides == [{}]:
+        destalinate_job(profile_dir=profile_dir)
+        return
+
+    workers = max(int(get_config().workspace_workers or 1), 1)
+    stagger = int(get_config().workspace_stagger or 0)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, values in enumerate(overrides):
+            if i and stagger:
+                time.sleep(stagger)
+            pool.submit(destalinate_workspace, values, profile_dir)
 
 
-def destalinate_job():
+def destalinate_workspace(values, profile_dir=None):
+    """Run `destalinate_job` with settings `values` applied, profiling into a subdirectory named after the workspace."""
+    with get_config().override(values):
+        slack_name = get_config().slack_name
+        logging.info("Destalinating %s", slack_name)
+        try:
+            destalinate_job(profile_dir=os.path.join(profile_dir, slack_name) if profile_dir else None)
+        except Exception:  # pylint: disable=W0703
+            logging.exception("Destalinating %s failed", slack_name)
+
+
+def destalinate_job(profile_dir=None):
+    """
+    Run every phase once. With `profile_dir` (default: the `profile_dir` setting), profile each phase
+    into that directory.
+    """
     raven_client = RavenClient()
+    profile_dir = profile_dir or get_config().profile_dir
 
     logging.info("Destalinating")
-    if not get_config().sb_token or not get_config().api_token:
-        logging.error(
-            "Missing at least one required Slack environment variable.\n"
-            "Make sure to set DESTALINATOR_SB_TOKEN and DESTALINATOR_API_TOKEN."
-        )
-    else:
-        try:
-            archiver.Archiver().archive()
-            warner.Warner().warn()
-            announcer.Announcer().announce()
-            flagger.Flagger().flag()
-            logging.info("OK: destalinated")
-        except Exception as e:  # pylint: disable=W0703
-            raven_client.captureException()
-            if not get_config().sentry_dsn:
-                raise e
-    logging.info("END: destalinate_job")
+    try:
+        if not get_config().sb_token or not get_config().api_token:
+            logging.error(
+                "Missing at least one required Slack environment variable.\n"
+                "Make sure to set DESTALINATOR_SB_TOKEN and DESTALINATOR_API_TOKEN."
+            )
+        else:
+            try:
+                # Bootstrap the workspace once and share it across every phase of this run
+                ws = workspace.Workspace()
+                profiler = PhaseProfiler(profile_dir, ws.metrics) if profile_dir else None
+                phase = profiler.phase if profiler else ws.metrics.phase
+                try:
+                    with phase('archive'):
+                        archiver.Archiver(workspace_injected=ws).archive()
+                    with phase('warn'):
+                        warner.Warner(workspace_injected=ws).warn()
+                    with phase('announce'):
+                        announcer.Announcer(workspace_injected=ws).announce()
+                    with phase('flag'):
+                        flagger.Flagger(workspace_injected=ws).flag()
+                finally:
+                    if get_config().metrics_path:
+                        ws.metrics.write(get_config().metrics_path)
+                    if profiler:
+                        profiler.write_summary()
+                logging.info("OK: destalinated")
+            except Exception as e:  # pylint: disable=W0703
+                raven_client.captureException()
+                if not get_config().sentry_dsn:
+                    raise e
+        logging.info("END: destalinate_job")
+    finally:
+        # Slack log records are posted in the background; make sure this run's are out before returning
+        flush_slack_logger()
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Run destalinator on a schedule.')
+    parser.add_argument("--profile", metavar="DIRECTORY", default=None,
+                        help="Profile each phase of a run, writing the profiles to DIRECTORY")
+    args = parser.parse_args()
+
     # Use RUN_ONCE to only run the destalinate job once immediately
     if get_config().run_once:
-        destalinate_job()
+        destalinate_all(profile_dir=args.profile)
     else:
-        schedule_job()
+        schedule_job(profile_dir=args.profile)
 
 
 if __name__ == "__main__":
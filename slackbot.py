@@ -1,15 +1,37 @@
 #! /usr/bin/env python2.7
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+from config import bind_config, get_config
+from utils.api_metrics import ApiMetrics
+from utils.rate_limiter import RateLimiter
+from utils.with_logger import WithLogger
+
 
-class Slackbot(object):
+class Slackbot(WithLogger):
 
-    def __init__(self, slack_name, token):
+    max_retry_attempts = 10
+
+    def __init__(self, slack_name, token, rate_limiter=None, metrics=None):
+        """
+        rate_limiter is an optional utils.rate_limiter.RateLimiter() to share with other clients of the same Slack.
+        metrics is an optional utils.api_metrics.ApiMetrics() to count requests in.
+        """
         self.slack_name = slack_name
         self.token = token
         assert self.token, "Token should not be blank"
         self.url = self.sb_url()
+        self.rate_limiter = rate_limiter or RateLimiter(get_config().rate_limits)
+        self.metrics = metrics or ApiMetrics()
+        # Posts share kept-alive connections, with at most `slackbot_concurrency` of them in flight at once
+        self.concurrency = max(int(get_config().slackbot_concurrency or 1), 1)
+        self.in_flight = threading.BoundedSemaphore(self.concurrency)
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=self.concurrency))
 
     def sb_url(self):
         url = "https://{}.slack.com/".format(self.slack_name)
@@ -24,5 +46,60 @@ class Slackbot(object):
         if channel[0] == '#':
             channel = channel[1:]
         nurl = self.url + "?token={}&channel=%23{}".format(self.token, channel)
-        p = requests.post(nurl, data=statement.encode('utf-8'))
-        return p.status_code
+        return self.post_with_retry(nurl, statement.encode('utf-8'), channel)
+
+    def say_many(self, messages):
+        """
+        Say each `(channel, statement)` in `messages`, returning the status codes in the same order.
+        Channels are posted to in parallel, and each channel's statements in the order given.
+        """
+        messages = list(messages)
+        by_channel = {}
+        for i, (channel, statement) in enumerate(messages):
+            by_channel.setdefault(channel, []).append((i, statement))
+
+        statuses = [None] * len(messages)
+
+        def say_in_order(channel):
+            for i, statement in by_channel[channel]:
+                statuses[i] = self.say(channel, statement)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in pool.map(bind_config(say_in_order), list(by_channel)):
+                pass
+        return statuses
+
+    def post_with_retry(self, url, data, channel):
+        """
+        POST `data` to `url`, retrying only when it can't have been posted: throttled (429) requests and ones whose
+        connection couldn't be opened. Server errors and dropped connections may have posted it already, so
+        retrying them could say it twice. Return the final HTTP status code.
+        """
+        retry_attempts = 0
+        while True:
+            self.rate_limiter.acquire('slackbot.say', channel)
+            try:
+                with self.in_flight:
+                    start = time.time()
+                    response = self.session.post(url, data=data)
+                    self.metrics.record('slackbot.say', time.time() - start, len(response.content))
+            except requests.exceptions.ConnectTimeout:
+                if retry_attempts >= self.max_retry_attempts:
+                    raise
+                response = None
+            else:
+                if response.status_code != 429 or retry_attempts >= self.max_retry_attempts:
+                    return response.status_code
+
+            if response is not None and 'Retry-After' in response.headers:
+                # hold back every post to this channel, not just this one
+                retry_after = int(response.headers['Retry-After'])
+                self.logger.debug('Ratelimited saying in #%s. Pausing it for %s', channel, retry_after)
+                self.rate_limiter.pause('slackbot.say', retry_after, channel)
+                self.metrics.record_retry('slackbot.say', retry_after)
+            else:
+                retry_attempts += 1
+                retry_after = retry_attempts * 5
+                self.metrics.record_retry('slackbot.say')
+                self.logger.debug('Error saying in #%s. Sleeping %s. %s/%s retry attempts.', channel, retry_after, retry_attempts, self.max_retry_attempts)
+                time.sleep(retry_after)
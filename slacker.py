@@ -5,23 +5,63 @@ import re
 import time
 
 import requests
+from requests.compat import quote
 
 from config import WithConfig
+from utils.api_metrics import ApiMetrics
+from utils.coalescing_cache import CoalescingCache
+from utils.rate_limiter import RateLimiter
 from utils.with_logger import WithLogger
 
 
+# The parts of each channels.list entry kept after bootstrapping; member lists are kept apart, as ChannelListings,
+# and the rest is dropped.
+CHANNEL_SUMMARY_KEYS = ('id', 'name', 'created', 'creator', 'purpose')
+
+
+class ChannelListing(object):
+    """A channel's creation time and members, as listed by channels.list."""
+
+    __slots__ = ('created', 'members', 'num_members')
+
+    def __init__(self, created, members):
+        self.created = created
+        self.members = tuple(members)
+        self.num_members = len(self.members)
+
+    @classmethod
+    def from_channel(cls, channel):
+        """Return the listing of a channels.list entry, or None if it lacks its creation time or full member list."""
+        members = channel.get('members')
+        if 'created' not in channel or members is None:
+            return None
+        if len(members) != channel.get('num_members', len(members)):
+            return None
+        return cls(channel['created'], members)
+
+
 class Slacker(WithLogger, WithConfig):
 
-    def __init__(self, slack_name, token, init=True):
+    def __init__(self, slack_name, token, init=True, rate_limiter=None, metrics=None):
         """
         slack name is the short name of the slack (preceding '.slack.com')
         token should be a Slack API Token.
+        rate_limiter is an optional utils.rate_limiter.RateLimiter() to share with other clients of the same Slack.
+        metrics is an optional utils.api_metrics.ApiMetrics() to count requests in.
         """
         self.slack_name = slack_name
         self.token = token
         assert self.token, "Token should not be blank"
         self.url = self.api_url()
+        self.rate_limiter = rate_limiter or RateLimiter(self.config.rate_limits)
+        self.metrics = metrics or ApiMetrics()
+        self.channel_info_cache = CoalescingCache(ttl=int(self.config.channel_info_ttl or 0))
+        self.channel_listings = {}
+        self.channels_listed_at = 0
         self.session = requests.Session()
+        # Give every concurrent channel evaluation its own kept-alive connection from the pool
+        pool_size = max(int(self.config.channel_workers or 1), requests.adapters.DEFAULT_POOLSIZE)
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
         if init:
             self.get_users()
             self.get_channels()
@@ -31,13 +71,22 @@ class Slacker(WithLogger, WithConfig):
         return self.get_with_retry_to_json(url)
 
     def get_users(self):
-        users = self.get_all_user_objects()
-        self.users_by_id = {x['id']: x['name'] for x in users}
-        self.restricted_users = [x['id'] for x in users if x.get('is_restricted')]
-        self.ultra_restricted_users = [x['id'] for x in users if x.get('is_ultra_restricted')]
+        """Index the user directory in a single streaming pass over users.list."""
+        self.index_users(self.iter_user_objects())
+
+    def index_users(self, users):
+        """Index the user directory from `users`, an iterable of users.list entries."""
+        self.users_by_id = {}
+        self.restricted_users = []
+        self.ultra_restricted_users = []
+        for user in users:
+            self.users_by_id[user['id']] = user['name']
+            if user.get('is_restricted'):
+                self.restricted_users.append(user['id'])
+            if user.get('is_ultra_restricted'):
+                self.ultra_restricted_users.append(user['id'])
         self.all_restricted_users = set(self.restricted_users + self.ultra_restricted_users)
         self.logger.debug("All restricted user names: %s", ', '.join([self.users_by_id[x] for x in self.all_restricted_users]))
-        return users
 
     def asciify(self, text):
         return ''.join([x for x in list(text) if ord(x) in range(128)])
@@ -50,13 +99,19 @@ class Slacker(WithLogger, WithConfig):
             if fail_silently:
                 return "#{}".format(channel_name)
 
+    def api_method(self, url):
+        """Return the Slack API method name (e.g. "channels.history") that `url` calls."""
+        return url[len(self.url):].split('?', 1)[0]
+
     def get_with_retry_to_json(self, url):
         # TODO: extract class
         retry_attempts = 0
         max_retry_attempts = 10
         payload = None
+        method = self.api_method(url)
         while not payload:
-            response = self.session.get(url)
+            self.rate_limiter.acquire(method)
+            response = self.timed(method, self.session.get, url)
 
             try:
                 response.raise_for_status()
@@ -64,41 +119,81 @@ class Slacker(WithLogger, WithConfig):
                 if retry_attempts >= max_retry_attempts:
                     raise e
                 if 'Retry-After' in response.headers:
-                    retry_after = int(response.headers['Retry-After']) * 2
-                    self.logger.debug('Ratelimited. Sleeping %s', retry_after)
+                    # hold back every caller of this method, not just this one
+                    retry_after = int(response.headers['Retry-After'])
+                    self.logger.debug('Ratelimited on %s. Pausing it for %s', method, retry_after)
+                    self.rate_limiter.pause(method, retry_after)
+                    self.metrics.record_retry(method, retry_after)
                 else:
                     retry_attempts += 1
                     retry_after = retry_attempts * 5
+                    self.metrics.record_retry(method)
                     self.logger.debug('Unknown requests error. Sleeping %s. %s/%s retry attempts.', retry_after, retry_attempts, max_retry_attempts)
-                time.sleep(retry_after)
+                    time.sleep(retry_after)
                 continue
             payload = response.json()
 
         return payload
 
-    def get_messages_in_time_range(self, oldest, cid, latest=None):
+    def timed(self, method, request, url, **kwargs):
+        """Make `request(url, **kwargs)`, counting it in `metrics` under API `method`."""
+        start = time.time()
+        response = request(url, **kwargs)
+        self.metrics.record(method, time.time() - start, len(response.content))
+        return response
+
+    def get_messages_in_time_range(self, oldest, cid, latest=None, lazy=False):
+        """
+        Return messages in channel `cid` from between `oldest` and `latest` (default: now), oldest first.
+        With `lazy`, return an iterator over them instead, newest first, which holds only one page in memory.
+        """
+        if lazy:
+            return self.iter_messages_in_time_range(oldest, cid, latest)
+        # pages arrive newest first, so reversing the whole stream puts it in chronological order
+        messages = list(self.iter_messages_in_time_range(oldest, cid, latest))
+        messages.reverse()
+        return messages
+
+    def iter_messages_in_time_range(self, oldest, cid, latest=None):
+        """
+        Yield messages in channel `cid` from between `oldest` and `latest`, newest first.
+        History is fetched one page at a time as the caller reads, so stopping early saves the remaining pages.
+        """
         assert cid in self.channels_by_id, "Unknown channel ID {}".format(cid)
         cname = self.channels_by_id[cid]
-        messages = []
-        done = False
-        while not done:
-            murl = self.url + "channels.history?oldest={}&token={}&channel={}".format(oldest, self.token, cid)
-            if latest:
-                murl += "&latest={}".format(latest)
-            else:
-                murl += "&latest={}".format(int(time.time()))
-            payload = self.get_with_retry_to_json(murl)
-            messages += payload['messages']
-            if payload['has_more'] is False:
-                done = True
-                continue
-            ts = [float(x['ts']) for x in messages]
-            earliest = min(ts)
-            latest = earliest
-        messages.sort(key=lambda x: float(x['ts']))
-        for message in messages:
-            message['channel'] = cname
-        return messages
+        for page in self.iter_history_pages(oldest, cid, latest):
+            for message in page:
+                message['channel'] = cname
+                yield message
+
+    def get_reacted_message(self, cid, ts):
+        """
+        Return the message at `ts` in channel `cid` with its current reactions, or None if Slack can't find it.
+        """
+        url = self.url + "reactions.get?token={}&channel={}&timestamp={}&full=1".format(self.token, cid, ts)
+        payload = self.get_with_retry_to_json(url)
+        if not payload.get('ok') or cid not in self.channels_by_id:
+            return None
+        message = payload['message']
+        message['channel'] = self.channels_by_id[cid]
+        return message
+
+    def iter_history_pages(self, oldest, cid, latest=None):
+        """
+        Yield pages of channels.history for channel `cid` from between `oldest` and `latest`, newest first.
+        Each page holds up to `history_page_size` messages; the cursor for the next page comes from the current
+        page alone, so pagination stays linear in the size of the history.
+        """
+        latest = latest or int(time.time())
+        url_template = self.url + "channels.history?oldest={}&token={}&channel={}&count={}&latest={}"
+        page_size = int(self.config.history_page_size or 100)
+        while True:
+            payload = self.get_with_retry_to_json(url_template.format(oldest, self.token, cid, page_size, latest))
+            page = payload['messages']
+            yield page
+            if payload['has_more'] is False or not page:
+                return
+            latest = min(float(x['ts']) for x in page)
 
     def replace_id(self, cid):
         """
@@ -138,12 +233,25 @@ class Slacker(WithLogger, WithConfig):
 
     def get_channels(self, exclude_archived=True):
         """
-        return a {channel_name: channel_id} dictionary
+        index the channel directory in a single streaming pass over channels.list
         if exclude_archived (default: True), only shows non-archived channels
         """
-        channels = self.get_all_channel_objects(exclude_archived=exclude_archived)
-        self.channels_by_id = {x['id']: x['name'] for x in channels}
-        self.channels_by_name = {x['name']: x['id'] for x in channels}
+        self.index_channels(self.iter_channel_objects(exclude_archived=exclude_archived))
+
+    def index_channels(self, channels):
+        """Index the channel directory from `channels`, an iterable of channels.list entries."""
+        self.channel_objects = []
+        self.channels_by_id = {}
+        self.channels_by_name = {}
+        self.channel_listings = {}
+        self.channels_listed_at = time.time()
+        for channel in channels:
+            self.channel_objects.append({k: channel[k] for k in CHANNEL_SUMMARY_KEYS if k in channel})
+            self.channels_by_id[channel['id']] = channel['name']
+            self.channels_by_name[channel['name']] = channel['id']
+            listing = ChannelListing.from_channel(channel)
+            if listing is not None:
+                self.channel_listings[channel['id']] = listing
         self.channels = self.channels_by_name
 
     def get_channelid(self, channel_name):
@@ -186,19 +294,33 @@ class Slacker(WithLogger, WithConfig):
     def get_channel_info(self, channel_name):
         """
         returns JSON with channel information.  Adds 'age' in seconds to JSON
+        Answered from channels.list for up to `channel_info_ttl` seconds after bootstrapping. Otherwise, or
+        if the listing lacks the channel's members, channels.info lookups are cached for `channel_info_ttl`
+        seconds, and concurrent lookups of a channel share one request.
         """
-        url_template = self.url + "channels.info?token={}&channel={}"
         cid = self.get_channelid(channel_name)
-        now = int(time.time())
+        info = self.listed_channel_info(channel_name, cid)
+        if info is None:
+            info = dict(self.channel_info_cache.get_or_load(cid, lambda: self.fetch_channel_info(channel_name, cid)))
+        info['age'] = int(time.time()) - info['created']
+        return info
+
+    def listed_channel_info(self, channel_name, cid):
+        """Return channel information from channels.list if it was listed within `channel_info_ttl` seconds, else None."""
+        listing = self.channel_listings.get(cid)
+        if listing is None or time.time() - self.channels_listed_at >= int(self.config.channel_info_ttl or 0):
+            return None
+        return {'id': cid, 'name': channel_name, 'created': listing.created, 'members': list(listing.members),
+                'num_members': listing.num_members}
+
+    def fetch_channel_info(self, channel_name, cid):
+        url_template = self.url + "channels.info?token={}&channel={}"
         url = url_template.format(self.token, cid)
         ret = self.get_with_retry_to_json(url)
         if ret['ok'] is not True:
             m = "Attempted to get channel info for {}, but return was {}"
             m = m.format(channel_name, ret)
             raise RuntimeError(m)
-        created = ret['channel']['created']
-        age = now - created
-        ret['channel']['age'] = age
         return ret['channel']
 
     def get_all_channel_objects(self, exclude_archived=True):
@@ -206,29 +328,65 @@ class Slacker(WithLogger, WithConfig):
         return all channels
         if exclude_archived (default: True), only shows non-archived channels
         """
+        return list(self.iter_channel_objects(exclude_archived=exclude_archived))
 
+    def iter_channel_objects(self, exclude_archived=True):
+        """
+        yield every channel, fetching channels.list one page at a time
+        if exclude_archived (default: True), only shows non-archived channels
+        """
         url_template = self.url + "channels.list?exclude_archived={}&token={}"
         if exclude_archived:
             exclude_archived = 1
         else:
             exclude_archived = 0
         url = url_template.format(exclude_archived, self.token)
-        payload = self.get_with_retry_to_json(url)
-        assert 'channels' in payload
-        return payload['channels']
+        return self.iter_cursor_pages(url, 'channels')
 
     def get_all_user_objects(self):
+        return list(self.iter_user_objects())
+
+    def iter_user_objects(self):
+        """yield every user, fetching users.list one page at a time"""
         url = self.url + "users.list?token=" + self.token
-        return self.get_with_retry_to_json(url)['members']
+        return self.iter_cursor_pages(url, 'members')
+
+    def iter_cursor_pages(self, url, key):
+        """
+        Yield the items listed under `key` by the cursor-paginated API `url`, `directory_page_size` at a time.
+        See https://api.slack.com/docs/pagination
+        """
+        page_size = int(self.config.directory_page_size or 200)
+        cursor = ''
+        while True:
+            payload = self.get_with_retry_to_json(url + "&limit={}&cursor={}".format(page_size, quote(cursor)))
+            assert key in payload
+            for item in payload[key]:
+                yield item
+            cursor = payload.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return
 
     def archive(self, channel_name):
         url_template = self.url + "channels.archive?token={}&channel={}"
         cid = self.get_channelid(channel_name)
         url = url_template.format(self.token, cid)
-        request = self.session.post(url)
+        self.rate_limiter.acquire('channels.archive')
+        request = self.timed('channels.archive', self.session.post, url)
         payload = request.json()
+        self.channel_info_cache.invalidate(cid)
+        if payload.get('ok'):
+            self.forget_channel(cid)
         return payload
 
+    def forget_channel(self, cid):
+        """Drop an archived channel from the directory, so later phases of the run leave it alone."""
+        name = self.channels_by_id.pop(cid, None)
+        if name is not None:
+            self.channels_by_name.pop(name, None)
+        self.channel_objects = [x for x in self.channel_objects if x['id'] != cid]
+        self.channel_listings.pop(cid, None)
+
     def post_message(self, channel, message, message_type=None):
         """
         Posts a `message` into a `channel`.
@@ -256,7 +414,8 @@ class Slacker(WithLogger, WithConfig):
                 post_data['icon_url'] = bot_avatar_url
 
         if message_type:
-            post_data['attachments'] = json.dumps([{'fallback': message_type}], encoding='utf-8')
+            post_data['attachments'] = json.dumps([{'fallback': message_type}])
 
-        p = self.session.post(self.url + "chat.postMessage", data=post_data)
+        self.rate_limiter.acquire('chat.postMessage', channel)
+        p = self.timed('chat.postMessage', self.session.post, self.url + "chat.postMessage", data=post_data)
         return p.json()
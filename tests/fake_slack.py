@@ -0,0 +1,176 @@
+"""
+An in-process fake of the parts of the Slack Web API that destalinator uses.
+
+    server = FakeSlack(channels=..., users=..., messages={channel_id: [message, ...]})
+    server.start()
+    slacker_obj.url = server.api_url
+    ...
+    server.stop()
+
+Every request is recorded in `server.calls` as `(method, params)`.
+Queue `(status, headers)` pairs in `server.failures[method]` to fail the next requests to `method` with them.
+"""
+
+import json
+import threading
+
+# support Python 2 and 3's versions of these modules
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeSlack(object):
+    default_page_size = 100
+
+    def __init__(self, channels=None, users=None, messages=None, emoji=None):
+        self.channels = channels or []
+        self.users = users or []
+        self.messages = messages or {}
+        self.emoji = emoji or {}
+        self.calls = []
+        self.posts = []
+        self.archived = []
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    @property
+    def api_url(self):
+        return self.url + "api/"
+
+    @property
+    def slackbot_url(self):
+        return self.url + "services/hooks/slackbot"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.respond(None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.respond(self.rfile.read(length).decode('utf-8'))
+
+            def respond(self, body):
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                path = parsed.path
+                if path.startswith('/api/'):
+                    if body:
+                        params.update({k: v[-1] for k, v in parse_qs(body).items()})
+                    method = path[len('/api/'):]
+                else:
+                    method = 'slackbot.say'
+                    params['text'] = body
+                status, headers = fake.failure(method, params) or (200, {})
+                payload = fake.handle(method, params) if status == 200 else {'ok': False, 'error': 'fake_failure'}
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def failure(self, method, params):
+        with self.lock:
+            failures = self.failures.get(method)
+            if failures:
+                self.calls.append((method, params))
+                return failures.pop(0)
+
+    def handle(self, method, params):
+        with self.lock:
+            self.calls.append((method, params))
+        handler = getattr(self, 'api_' + method.replace('.', '_'), None)
+        if handler is None:
+            return {'ok': False, 'error': 'unknown_method'}
+        return handler(params)
+
+    def channel(self, cid):
+        for channel in self.channels:
+            if channel['id'] == cid:
+                return channel
+
+    def cursor_page(self, key, items, params):
+        """Serve `items` the way Slack's cursor-paginated methods do, with the cursor being the next offset."""
+        limit = int(params.get('limit') or 0) or len(items)
+        offset = int(params.get('cursor') or 0)
+        next_offset = offset + limit
+        return {'ok': True, key: items[offset:next_offset],
+                'response_metadata': {'next_cursor': str(next_offset) if next_offset < len(items) else ''}}
+
+    def api_users_list(self, params):
+        return self.cursor_page('members', self.users, params)
+
+    def api_channels_list(self, params):
+        return self.cursor_page('channels', self.channels, params)
+
+    def api_emoji_list(self, params):
+        return {'ok': True, 'emoji': self.emoji}
+
+    def api_channels_info(self, params):
+        channel = self.channel(params.get('channel'))
+        if channel is None:
+            return {'ok': False, 'error': 'channel_not_found'}
+        return {'ok': True, 'channel': channel}
+
+    def api_channels_history(self, params):
+        oldest = float(params.get('oldest') or 0)
+        latest = float(params.get('latest') or 'inf')
+        count = int(params.get('count') or self.default_page_size)
+        inclusive = params.get('inclusive') in ('1', 'true')
+        in_range = [m for m in self.messages.get(params.get('channel'), [])
+                    if (oldest <= float(m['ts']) <= latest if inclusive else oldest < float(m['ts']) < latest)]
+        in_range.sort(key=lambda m: float(m['ts']), reverse=True)
+        return {'ok': True, 'messages': [dict(m) for m in in_range[:count]], 'has_more': len(in_range) > count}
+
+    def api_reactions_get(self, params):
+        for message in self.messages.get(params.get('channel'), []):
+            if message['ts'] == params.get('timestamp'):
+                return {'ok': True, 'type': 'message', 'channel': params.get('channel'), 'message': dict(message)}
+        return {'ok': False, 'error': 'message_not_found'}
+
+    def api_channels_archive(self, params):
+        with self.lock:
+            self.archived.append(params.get('channel'))
+        return {'ok': True}
+
+    def api_chat_postMessage(self, params):
+        with self.lock:
+            self.posts.append((params.get('channel'), params.get('text')))
+        return {'ok': True, 'channel': params.get('channel'), 'ts': '1.0'}
+
+    def api_slackbot_say(self, params):
+        with self.lock:
+            self.posts.append((params.get('channel', '').lstrip('#'), params.get('text')))
+        return {'ok': True}
@@ -8,16 +8,17 @@ import slacker
 def mocked_slackbot_object():
     obj = mock.MagicMock(wraps=slackbot.Slackbot(get_config().slack_name, token='token'))
     obj.say = mock.MagicMock(return_value=True)
+    obj.say_many = mock.MagicMock(side_effect=lambda messages: [obj.say(channel, statement) for channel, statement in messages])
     return obj
 
 
 def mocked_slacker_object(channels_list=None, users_list=None, messages_list=None, emoji_list=None):
     slacker_obj = slacker.Slacker(get_config().slack_name, token='token', init=False)
 
-    slacker_obj.get_all_channel_objects = mock.MagicMock(return_value=channels_list or [])
+    slacker_obj.iter_channel_objects = mock.MagicMock(side_effect=lambda **kwargs: iter(channels_list or []))
     slacker_obj.get_channels()
 
-    slacker_obj.get_all_user_objects = mock.MagicMock(return_value=users_list or [])
+    slacker_obj.iter_user_objects = mock.MagicMock(side_effect=lambda: iter(users_list or []))
     slacker_obj.get_users()
 
     slacker_obj.get_messages_in_time_range = mock.MagicMock(return_value=messages_list or [])
@@ -0,0 +1,68 @@
+import logging
+import threading
+import unittest
+
+import mock
+
+from utils.action_queue import ActionQueue
+from utils.with_logger import WithLogger
+
+
+class Recorder(WithLogger):
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, key, step):
+        self.logger.warning("%s %s", key, step)
+        with self.lock:
+            self.calls.append((key, step))
+        return step
+
+
+class ActionQueueTest(unittest.TestCase):
+    def test_actions_for_a_key_run_in_order(self):
+        recorder = Recorder()
+        outbound = ActionQueue(4)
+        for step in range(5):
+            for key in ('a', 'b', 'c'):
+                outbound.submit(key, recorder, key, step)
+        list(outbound.drain())
+        for key in ('a', 'b', 'c'):
+            self.assertEqual([step for k, step in recorder.calls if k == key], list(range(5)))
+
+    def test_keys_run_concurrently(self):
+        both_started = threading.Barrier(2) if hasattr(threading, 'Barrier') else None
+        if both_started is None:
+            self.skipTest("needs threading.Barrier")
+        outbound = ActionQueue(2)
+        outbound.submit('a', both_started.wait, 5)
+        outbound.submit('b', both_started.wait, 5)
+        self.assertTrue(all(action.error is None for action in outbound.drain()))
+
+    def test_results_and_errors_are_reported_per_action(self):
+        def fail():
+            raise ValueError("nope")
+
+        outbound = ActionQueue(2)
+        outbound.submit('a', lambda: 'done')
+        outbound.submit('b', fail)
+        actions = list(outbound.drain())
+        self.assertEqual([(a.key, a.value) for a in actions], [('a', 'done'), ('b', None)])
+        self.assertIsInstance(actions[1].error, ValueError)
+
+    def test_logs_are_replayed_in_submission_order(self):
+        recorder = Recorder()
+        outbound = ActionQueue(4)
+        for key in range(10):
+            outbound.submit(key, recorder, key, 0)
+        with mock.patch('logging.Logger.handle') as handle:
+            list(outbound.drain())
+        logged = [c[1][0].args[0] for c in handle.mock_calls if c[1][0].levelno == logging.WARNING]
+        self.assertEqual(logged, list(range(10)))
+
+    def test_single_worker_runs_actions_on_submit(self):
+        recorder = Recorder()
+        outbound = ActionQueue(1)
+        outbound.submit('a', recorder, 'a', 0)
+        self.assertEqual(recorder.calls, [('a', 0)])
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from activity_index import ActivityIndex
+import destalinator
+import tests.mocks as mocks
+
+DAY = 86400
+
+
+class FakeHistory(object):
+    """Stands in for Slacker.iter_messages_in_time_range over a fixed set of message timestamps."""
+    def __init__(self, timestamps):
+        self.timestamps = sorted(timestamps, reverse=True)
+        self.requests = []
+
+    def __call__(self, oldest, cid, latest=None):
+        self.requests.append((oldest, latest))
+        for ts in self.timestamps:
+            if oldest < ts < latest:
+                yield {'type': 'message', 'user': 'U012742', 'text': 'Hi', 'ts': str(ts)}
+
+
+class DestalinatorActivityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ActivityIndex(':memory:', rules={'ignore_users': []})
+        self.slacker = mock.MagicMock()
+        self.slacker.get_channelid.return_value = 'C012839'
+        self.slackbot = mocks.mocked_slackbot_object()
+
+    def recently_active(self, now, days, history):
+        ds = destalinator.Destalinator(self.slacker, self.slackbot, activated=True, activity_index=self.index)
+        ds.now = now
+        self.slacker.iter_messages_in_time_range.side_effect = history
+        return ds.recently_active('leninists', days)
+
+    def test_first_run_reads_the_whole_window(self):
+        history = FakeHistory([1000 * DAY - 40 * DAY])
+        self.assertFalse(self.recently_active(1000 * DAY, 30, history))
+        self.assertEqual(history.requests, [(970 * DAY, 1000 * DAY)])
+        self.assertEqual(self.index.get('C012839'), (None, 970 * DAY, 1000 * DAY))
+
+    def test_later_runs_read_only_new_history(self):
+        history = FakeHistory([990 * DAY])
+        self.assertTrue(self.recently_active(1000 * DAY, 30, history))
+        self.assertTrue(self.recently_active(1001 * DAY, 30, history))
+        self.assertEqual(history.requests[-1], (1000 * DAY, 1001 * DAY))
+
+    def test_activity_ages_out_without_rereading(self):
+        history = FakeHistory([990 * DAY])
+        self.assertTrue(self.recently_active(1000 * DAY, 30, history))
+        self.assertFalse(self.recently_active(1021 * DAY, 30, history))
+        self.assertEqual(len(history.requests), 2)
+
+    def test_wider_window_backfills_older_history(self):
+        history = FakeHistory([950 * DAY])
+        self.assertFalse(self.recently_active(1000 * DAY, 30, history))
+        self.assertTrue(self.recently_active(1000 * DAY, 60, history))
+        self.assertEqual(history.requests[-1], (940 * DAY, 970 * DAY))
+        self.assertEqual(len(history.requests), 2)
+
+    def test_later_phase_of_the_same_run_reads_nothing(self):
+        history = FakeHistory([990 * DAY])
+        self.assertTrue(self.recently_active(1000 * DAY, 60, history))
+        self.assertTrue(self.recently_active(1000 * DAY, 30, history))
+        self.assertEqual(history.requests, [(940 * DAY, 1000 * DAY)])
+
+    def test_entry_synced_before_the_window_is_not_read_on_from(self):
+        history = FakeHistory([990 * DAY, 1050 * DAY])
+        self.assertTrue(self.recently_active(1000 * DAY, 30, history))
+        self.assertTrue(self.recently_active(1100 * DAY, 60, history))
+        self.assertEqual(history.requests[-1], (1040 * DAY, 1100 * DAY))
+        self.assertEqual(self.index.get('C012839'), (1050 * DAY, 1040 * DAY, 1100 * DAY))
+
+
+class ActivityIndexPersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'activity.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_survive_reopening(self):
+        ActivityIndex(self.path, rules={'ignore_users': []}).update('C012839', 990 * DAY, 970 * DAY, 1000 * DAY)
+        self.assertEqual(ActivityIndex(self.path, rules={'ignore_users': []}).get('C012839'),
+                         (990 * DAY, 970 * DAY, 1000 * DAY))
+
+    def test_entries_from_other_rules_are_ignored(self):
+        ActivityIndex(self.path, rules={'ignore_users': []}).update('C012839', 990 * DAY, 970 * DAY, 1000 * DAY)
+        self.assertIsNone(ActivityIndex(self.path, rules={'ignore_users': ['U012742']}).get('C012839'))
@@ -3,6 +3,7 @@ import time
 import unittest
 import mock
 
+from config import get_config
 import announcer
 from tests.test_destalinator import MockValidator
 import tests.fixtures as fixtures
@@ -14,6 +15,8 @@ class AnnouncerAnnounceTest(unittest.TestCase):
         slacker_obj = mocks.mocked_slacker_object(channels_list=fixtures.channels, users_list=fixtures.users)
         self.slackbot = mocks.mocked_slackbot_object()
         with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true'}):
+            get_config().reload()
+            self.addCleanup(get_config().reload)
             self.announcer = announcer.Announcer(slacker_injected=slacker_obj, slackbot_injected=self.slackbot)
 
     def test_announce_posts_to_announce_channel(self):
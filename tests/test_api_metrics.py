@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import slacker
+from tests.fake_slack import FakeSlack
+from utils.api_metrics import ApiMetrics
+from utils.rate_limiter import RateLimiter
+
+
+class ApiMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = ApiMetrics()
+
+    def test_counts_calls_per_method_and_phase(self):
+        self.metrics.record('users.list', 0.01, 100)
+        with self.metrics.phase('archive'):
+            self.metrics.record('channels.history', 0.2, 1000)
+            self.metrics.record('channels.history', 3.0, 500)
+            self.metrics.record_retry('channels.history', 7)
+        totals = self.metrics.to_dict()
+        history = totals['methods']['channels.history']
+        self.assertEqual((history['calls'], history['bytes_received'], history['retries'], history['throttled_seconds']),
+                         (2, 1500, 1, 7))
+        self.assertEqual(history['latency_seconds']['buckets']['0.1'], 0)
+        self.assertEqual(history['latency_seconds']['buckets']['0.25'], 1)
+        self.assertEqual(history['latency_seconds']['buckets']['5.0'], 2)
+        self.assertEqual(history['latency_seconds']['buckets']['+Inf'], 2)
+        self.assertEqual(totals['phases'], {'archive': {'channels.history': 2}})
+
+    def test_prometheus_textfile(self):
+        with self.metrics.phase('warn'):
+            self.metrics.record('chat.postMessage', 0.5, 10)
+        text = self.metrics.to_prometheus()
+        self.assertIn('destalinator_api_calls_total{method="chat.postMessage"} 1\n', text)
+        self.assertIn('destalinator_api_request_duration_seconds_bucket{method="chat.postMessage",le="0.25"} 0\n', text)
+        self.assertIn('destalinator_api_request_duration_seconds_bucket{method="chat.postMessage",le="+Inf"} 1\n', text)
+        self.assertIn('destalinator_api_phase_calls_total{phase="warn",method="chat.postMessage"} 1\n', text)
+        self.assertIn('# TYPE destalinator_api_request_duration_seconds histogram\n', text)
+
+    def test_write_picks_format_from_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.metrics.record('emoji.list', 0.1, 10)
+        self.metrics.write(os.path.join(directory, 'metrics.json'))
+        self.metrics.write(os.path.join(directory, 'metrics.prom'))
+        with open(os.path.join(directory, 'metrics.json')) as f:
+            self.assertEqual(json.load(f)['methods']['emoji.list']['calls'], 1)
+        with open(os.path.join(directory, 'metrics.prom')) as f:
+            self.assertIn('destalinator_api_calls_total{method="emoji.list"} 1', f.read())
+        self.assertEqual(sorted(os.listdir(directory)), ['metrics.json', 'metrics.prom'])
+
+
+class SlackerMetricsTest(unittest.TestCase):
+    def test_requests_and_retries_are_counted(self):
+        server = FakeSlack(channels=[{'id': 'C1', 'name': 'general', 'created': 0}]).start()
+        self.addCleanup(server.stop)
+        server.failures['channels.list'] = [(429, {'Retry-After': '0'})]
+        metrics = ApiMetrics()
+        sl = slacker.Slacker('testing', 'token', init=False, metrics=metrics,
+                             rate_limiter=RateLimiter({'default': {'per_minute': 10 ** 9}}))
+        sl.url = server.api_url
+        with metrics.phase('bootstrap'):
+            sl.get_channels()
+        channels_list = metrics.to_dict()['methods']['channels.list']
+        self.assertEqual((channels_list['calls'], channels_list['retries']), (2, 1))
+        self.assertGreater(channels_list['bytes_received'], 0)
+        self.assertEqual(metrics.to_dict()['phases'], {'bootstrap': {'channels.list': 2}})
@@ -0,0 +1,134 @@
+import time
+import unittest
+
+import mock
+
+from config import get_config
+import tests.fixtures as fixtures
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+# asyncio support needs Python 3.5+ and aiohttp
+try:
+    import asyncio
+    import async_destalinator
+    import async_slacker
+except (ImportError, SyntaxError):
+    async_slacker = None
+
+
+def history(count, start, step=60, **extra):
+    messages = []
+    for i in range(count):
+        message = {"type": "message", "user": "U012742", "text": "Hi", "ts": "{:.6f}".format(start + i * step)}
+        message.update(extra)
+        messages.append(message)
+    return messages
+
+
+@unittest.skipIf(async_slacker is None, "asyncio client needs Python 3.5+ and aiohttp")
+class AsyncSlackerTest(unittest.TestCase):
+    def setUp(self):
+        now = int(time.time())
+        channels = [dict(c, members=['U012742', 'U023BECGF']) for c in fixtures.channels]
+        channels[0]['id'] = 'C0000001'
+        channels[1]['id'] = 'C0000002'
+        self.busy, self.quiet = channels[0], channels[1]
+        self.busy['created'] = self.quiet['created'] = now - 86400 * 90
+        self.server = FakeSlack(channels=channels[:2], users=fixtures.users, messages={
+            self.busy['id']: history(250, now - 86400 * 5),
+            self.quiet['id']: history(3, now - 86400 * 5, user='USLACKBOT'),
+        }).start()
+        self.loop = asyncio.new_event_loop()
+        unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+        self.slacker = async_slacker.AsyncSlacker('testing', 'token', rate_limiter=unlimited)
+        self.slacker.url = self.server.api_url
+        self.slackbot = async_slacker.AsyncSlackbot('testing', 'token', rate_limiter=unlimited)
+        self.slackbot.url = self.server.slackbot_url
+        self.run_async(self.slacker.init())
+
+    def tearDown(self):
+        self.run_async(self.slacker.close())
+        self.run_async(self.slackbot.close())
+        self.loop.close()
+        self.server.stop()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_init_loads_users_and_channels(self):
+        self.assertEqual(self.slacker.channels_by_name[self.busy['name']], self.busy['id'])
+        self.assertEqual(len(self.slacker.users_by_id), len(fixtures.users))
+
+    def calls(self, method):
+        return [params for called, params in self.server.calls if called == method]
+
+    @mock.patch.object(get_config(), 'history_page_size', 100)
+    def test_get_messages_in_time_range_paginates(self):
+        messages = self.run_async(self.slacker.get_messages_in_time_range(0, self.busy['id']))
+        self.assertEqual(len(messages), 250)
+        self.assertEqual([params['count'] for params in self.calls('channels.history')], ['100'] * 3)
+        self.assertEqual([m['ts'] for m in messages], sorted(m['ts'] for m in messages))
+
+    def test_get_channel_info_adds_age(self):
+        info = self.run_async(self.slacker.get_channel_info(self.busy['name']))
+        self.assertGreaterEqual(info['age'], 86400 * 90)
+
+    def test_channel_info_comes_from_the_listing(self):
+        members = self.run_async(self.slacker.get_channel_members_ids(self.busy['name']))
+        self.assertEqual(members, ['U012742', 'U023BECGF'])
+        self.assertEqual(self.calls('channels.info'), [])
+
+    @mock.patch.object(get_config(), 'channel_info_ttl', 60)
+    def test_concurrent_channel_info_lookups_share_one_request(self):
+        self.slacker.channels_listed_at -= 61
+        lookups = [self.loop.create_task(self.slacker.get_channel_info(self.busy['name'])) for _ in range(3)]
+        infos = self.run_async(asyncio.gather(*lookups))
+        self.assertEqual([info['id'] for info in infos], [self.busy['id']] * 3)
+        self.run_async(self.slacker.get_channel_info(self.busy['name']))
+        self.assertEqual(len(self.calls('channels.info')), 1)
+
+    @mock.patch.object(get_config(), 'directory_page_size', 2)
+    def test_directory_is_paginated(self):
+        self.run_async(self.slacker.init())
+        self.assertEqual(len(self.slacker.users_by_id), len(fixtures.users))
+        self.assertEqual(len(self.calls('users.list')), 1 + (len(fixtures.users) + 1) // 2)
+
+    def test_requests_are_counted_in_metrics(self):
+        self.run_async(self.slacker.get_messages_in_time_range(0, self.quiet['id']))
+        self.run_async(self.slacker.post_message(self.quiet['name'], 'Hello'))
+        self.run_async(self.slackbot.say(self.quiet['name'], 'Hello'))
+        self.assertEqual(self.slacker.metrics.methods['channels.history'].calls, 1)
+        self.assertGreater(self.slacker.metrics.methods['channels.history'].bytes_received, 0)
+        self.assertEqual(self.slacker.metrics.methods['chat.postMessage'].calls, 1)
+        self.assertEqual(self.slackbot.metrics.methods['slackbot.say'].calls, 1)
+
+    def test_say_posts_to_channel(self):
+        status = self.run_async(self.slackbot.say('#' + self.busy['name'], 'Hello'))
+        self.assertEqual(status, 200)
+        self.assertIn((self.busy['name'], 'Hello'), self.server.posts)
+
+    @mock.patch.object(get_config(), 'ignore_users', ['USLACKBOT'])
+    def test_stale_channels(self):
+        ds = async_destalinator.AsyncDestalinator(self.slacker, self.slackbot, activated=True)
+        self.assertEqual(self.run_async(ds.stale_channels(30)), [self.quiet['name']])
+
+    def test_sync_only_methods_are_refused(self):
+        ds = async_destalinator.AsyncDestalinator(self.slacker, self.slackbot, activated=True)
+        self.assertRaises(TypeError, ds.warn_all, 30)
+        self.assertRaises(TypeError, ds.safe_archive_all, 60)
+        self.assertRaises(TypeError, ds.recently_active, self.quiet['name'], 30)
+        self.assertEqual(self.server.calls, [c for c in self.server.calls if c[0] in ('users.list', 'channels.list')])
+
+    def test_archive_posts_then_archives(self):
+        ds = async_destalinator.AsyncDestalinator(self.slacker, self.slackbot, activated=True)
+        payload = self.run_async(ds.archive(self.quiet['name']))
+        self.assertTrue(payload['ok'])
+        self.assertEqual(self.server.archived, [self.quiet['id']])
+        self.assertIsNone(self.slacker.get_channelid(self.quiet['name']))
+        self.assertEqual([p[0] for p in self.server.posts], [self.quiet['name']] * 2)
+
+    def test_warn_posts_warning_once(self):
+        ds = async_destalinator.AsyncDestalinator(self.slacker, self.slackbot, activated=True)
+        self.assertTrue(self.run_async(ds.warn(self.quiet['name'], 30)))
+        self.assertEqual(self.server.posts, [(self.quiet['name'], ds.add_slack_channel_markup(ds.warning_text))])
@@ -1,7 +1,11 @@
 import os
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from config import get_config
+import mock
+
+from config import bind_config, get_config
 
 
 class ConfigTest(unittest.TestCase):
@@ -9,6 +13,65 @@ class ConfigTest(unittest.TestCase):
         os.environ['DESTALINATOR_STRING_VARIABLE'] = 'test'
         os.environ['DESTALINATOR_LIST_VARIABLE'] = 'test,'
 
+    def tearDown(self):
+        del os.environ['DESTALINATOR_STRING_VARIABLE']
+        del os.environ['DESTALINATOR_LIST_VARIABLE']
+
     def test_environment_variable_configs(self):
         self.assertEqual(get_config().string_variable, 'test')
         self.assertListEqual(get_config().list_variable, ['test'])
+
+
+class ConfigSettingsTest(unittest.TestCase):
+    def tearDown(self):
+        get_config().reload()
+
+    @mock.patch.dict(os.environ, {'DESTALINATOR_WARN_THRESHOLD': '7', 'DESTALINATOR_IGNORE_USERS': 'USLACKBOT'})
+    def test_environment_overrides_are_typed(self):
+        get_config().reload()
+        self.assertEqual(get_config().warn_threshold, 7)
+        self.assertEqual(get_config().ignore_users, ('USLACKBOT',))
+
+    @mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'false'})
+    def test_false_boolean_from_environment(self):
+        get_config().reload()
+        self.assertIs(get_config().settings.activated, False)
+
+    def test_environment_is_read_only_on_reload(self):
+        warn_threshold = get_config().warn_threshold
+        with mock.patch.dict(os.environ, {'DESTALINATOR_WARN_THRESHOLD': '7'}):
+            self.assertEqual(get_config().warn_threshold, warn_threshold)
+            get_config().reload()
+            self.assertEqual(get_config().warn_threshold, 7)
+
+    def test_settings_are_read_only(self):
+        with self.assertRaises(AttributeError):
+            get_config().settings.warn_threshold = 7
+
+
+class ConfigOverrideTest(unittest.TestCase):
+    def test_override_applies_on_this_thread_only(self):
+        config = get_config()
+        default = config.warn_threshold
+        seen = []
+        with config.override({'warn_threshold': '7', 'slack_name': 'acme'}):
+            self.assertEqual((config.warn_threshold, config.slack_name), (7, 'acme'))
+            other = threading.Thread(target=lambda: seen.append(config.warn_threshold))
+            other.start()
+            other.join()
+        self.assertEqual(seen, [default])
+        self.assertEqual(config.warn_threshold, default)
+
+    def test_nested_overrides_fall_back_to_outer_ones(self):
+        config = get_config()
+        with config.override({'slack_name': 'acme', 'warn_threshold': 7}):
+            with config.override({'warn_threshold': 9}):
+                self.assertEqual((config.slack_name, config.warn_threshold), ('acme', 9))
+            self.assertEqual(config.warn_threshold, 7)
+
+    def test_bind_config_carries_overrides_to_worker_threads(self):
+        config = get_config()
+        with config.override({'slack_name': 'acme'}):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                names = list(pool.map(bind_config(lambda _: config.slack_name), range(4)))
+        self.assertEqual(names, ['acme'] * 4)
@@ -6,6 +6,7 @@ import unittest
 
 from config import get_config
 import destalinator
+from message_record import MessageRecord
 import slacker
 import slackbot
 
@@ -90,6 +91,10 @@ sample_warning_messages = [
 ]
 
 
+def records(messages):
+    return [MessageRecord.from_message(m) for m in messages]
+
+
 class MockValidator(object):
 
     def __init__(self, validator):
@@ -190,6 +195,8 @@ class DestalinatorGetEarliestArchiveDateTestCase(unittest.TestCase):
     # TODO: This test (and others) would be redundant with solid testing around config directly.
     @mock.patch.dict(os.environ, {'DESTALINATOR_EARLIEST_ARCHIVE_DATE': target_archive_date_string})
     def test_env_var_name_set_in_config(self):
+        get_config().reload()
+        self.addCleanup(get_config().reload)
         self.destalinator = destalinator.Destalinator(self.slacker, self.slackbot, activated=True)
         self.assertEqual(self.destalinator.get_earliest_archive_date(), target_archive_date)
 
@@ -326,7 +333,7 @@ class DestalinatorStaleTestCase(unittest.TestCase):
     def test_with_all_sample_messages(self, mock_slacker):
         self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
         mock_slacker.get_channel_info.return_value = {'age': 60 * 86400}
-        self.destalinator.get_messages = mock.MagicMock(return_value=sample_slack_messages)
+        self.destalinator.iter_messages = mock.MagicMock(return_value=records(sample_slack_messages))
         self.assertFalse(self.destalinator.stale('stalinists', 30))
 
     @mock.patch.object(get_config(), 'ignore_users', [m['user'] for m in sample_slack_messages if m.get('user')])
@@ -335,7 +342,7 @@ class DestalinatorStaleTestCase(unittest.TestCase):
         self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
         mock_slacker.get_channel_info.return_value = {'age': 60 * 86400}
         mock_slacker.channel_has_only_restricted_members.return_value = False
-        self.destalinator.get_messages = mock.MagicMock(return_value=sample_slack_messages)
+        self.destalinator.iter_messages = mock.MagicMock(return_value=records(sample_slack_messages))
         self.assertTrue(self.destalinator.stale('stalinists', 30))
 
     @mock.patch('tests.test_destalinator.SlackerMock')
@@ -352,15 +359,43 @@ class DestalinatorStaleTestCase(unittest.TestCase):
             }
         ]
         mock_slacker.channel_has_only_restricted_members.return_value = False
-        self.destalinator.get_messages = mock.MagicMock(return_value=messages)
+        self.destalinator.iter_messages = mock.MagicMock(return_value=records(messages))
         self.assertTrue(self.destalinator.stale('stalinists', 30))
 
     @mock.patch('tests.test_destalinator.SlackerMock')
     def test_with_only_an_attachment_message(self, mock_slacker):
         self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
         mock_slacker.get_channel_info.return_value = {'age': 60 * 86400}
-        self.destalinator.get_messages = mock.MagicMock(return_value=[m for m in sample_slack_messages if 'attachments' in m])
+        self.destalinator.iter_messages = mock.MagicMock(return_value=records(m for m in sample_slack_messages if 'attachments' in m))
+        self.assertFalse(self.destalinator.stale('stalinists', 30))
+
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_stops_reading_history_at_first_activity(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channel_info.return_value = {'age': 60 * 86400}
+        mock_slacker.channel_has_only_restricted_members.return_value = False
+        read = []
+
+        def history(oldest, cid, latest=None):
+            for message in sample_slack_messages:
+                read.append(message)
+                yield message
+
+        mock_slacker.iter_messages_in_time_range.side_effect = history
         self.assertFalse(self.destalinator.stale('stalinists', 30))
+        self.assertEqual(read, sample_slack_messages[:1])
+
+    @mock.patch.object(get_config(), 'ignore_users', [m['user'] for m in sample_slack_messages if m.get('user')])
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_caches_history_read_to_the_end(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channel_info.return_value = {'age': 60 * 86400}
+        mock_slacker.channel_has_only_restricted_members.return_value = False
+        mock_slacker.iter_messages_in_time_range.side_effect = lambda oldest, cid, latest=None: iter(sample_slack_messages)
+        self.assertTrue(self.destalinator.stale('stalinists', 30))
+        self.assertEqual([m.ts for m in self.destalinator.get_messages('stalinists', 30)],
+                         [float(m['ts']) for m in reversed(sample_slack_messages)])
+        self.assertFalse(mock_slacker.get_messages_in_time_range.called)
 
 
 class DestalinatorArchiveTestCase(unittest.TestCase):
@@ -496,6 +531,63 @@ class DestalinatorSafeArchiveAllTestCase(unittest.TestCase):
         self.destalinator.safe_archive_all(self.destalinator.config.archive_threshold)
         self.assertFalse(mock_slacker.archive.called)
 
+    @mock.patch.object(get_config(), 'channel_workers', 4)
+    @mock.patch.object(get_config(), 'outbound_workers', 1)
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_archives_in_channel_order_with_workers(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        names = ['channel-{:02d}'.format(i) for i in range(20)]
+        mock_slacker.channels_by_name = {name: 'C{:02d}'.format(i) for i, name in enumerate(reversed(names))}
+        self.destalinator.stale = mock.MagicMock(side_effect=lambda channel, days: int(channel[-2:]) % 3 == 0)
+        self.destalinator.safe_archive = mock.MagicMock()
+        self.destalinator.safe_archive_all(self.destalinator.config.archive_threshold)
+        self.assertEqual(self.destalinator.safe_archive.mock_calls,
+                         [mock.call(name) for name in names if int(name[-2:]) % 3 == 0])
+
+    @mock.patch.object(get_config(), 'channel_workers', 4)
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_replays_worker_logs_in_channel_order(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        names = ['channel-{:02d}'.format(i) for i in range(20)]
+        mock_slacker.channels_by_name = {name: 'C{:02d}'.format(i) for i, name in enumerate(names)}
+
+        def fake_stale(channel, days):
+            self.destalinator.logger.warning("Evaluated %s", channel)
+            return False
+
+        self.destalinator.stale = mock.MagicMock(side_effect=fake_stale)
+        with mock.patch('logging.Logger.handle') as handle:
+            self.destalinator.safe_archive_all(self.destalinator.config.archive_threshold)
+        evaluated = [c[1][0].args[0] for c in handle.mock_calls if c[1][0].msg == "Evaluated %s"]
+        self.assertEqual(evaluated, names)
+
+    @mock.patch.object(get_config(), 'outbound_workers', 4)
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_reports_results_per_channel(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.channels_by_name = {'leninists': 'C012839', 'stalinists': 'C102843', 'trotskyists': 'C0184982'}
+        self.destalinator.stale = mock.MagicMock(side_effect=lambda channel, days: channel != 'stalinists')
+        self.destalinator.safe_archive = mock.MagicMock(side_effect=lambda channel: {'ok': True, 'channel': channel})
+        results = self.destalinator.safe_archive_all(self.destalinator.config.archive_threshold)
+        self.assertEqual(results, {'leninists': {'ok': True, 'channel': 'leninists'},
+                                   'trotskyists': {'ok': True, 'channel': 'trotskyists'}})
+
+    @mock.patch.object(get_config(), 'outbound_workers', 4)
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_failures_are_raised_after_every_channel_is_done(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.channels_by_name = {'leninists': 'C012839', 'stalinists': 'C102843'}
+        self.destalinator.stale = mock.MagicMock(return_value=True)
+
+        def fake_safe_archive(channel):
+            if channel == 'leninists':
+                raise RuntimeError("boom")
+
+        self.destalinator.safe_archive = mock.MagicMock(side_effect=fake_safe_archive)
+        with self.assertRaises(RuntimeError):
+            self.destalinator.safe_archive_all(self.destalinator.config.archive_threshold)
+        self.assertEqual(self.destalinator.safe_archive.call_count, 2)
+
 
 class DestalinatorWarnTestCase(unittest.TestCase):
     def setUp(self):
@@ -552,3 +644,82 @@ class DestalinatorWarnTestCase(unittest.TestCase):
         ]
         self.destalinator.warn("stalinists", 30)
         self.assertFalse(mock_slacker.post_message.called)
+
+
+class DestalinatorMessageRecordTestCase(unittest.TestCase):
+    def setUp(self):
+        self.slacker = SlackerMock("testing", "token")
+        self.slackbot = slackbot.Slackbot("testing", "token")
+
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_cache_holds_compact_records(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channelid.return_value = "123456"
+        mock_slacker.get_messages_in_time_range.return_value = iter(reversed(sample_slack_messages + sample_warning_messages))
+        messages = self.destalinator.get_messages("general", 30)
+        self.assertTrue(all(isinstance(m, MessageRecord) for m in messages))
+        # pages stream in newest first, and are cached oldest first
+        self.assertEqual([m.ts for m in messages], [float(m['ts']) for m in sample_slack_messages + sample_warning_messages])
+        self.assertEqual(mock_slacker.get_messages_in_time_range.call_args[1], {'lazy': True})
+        self.assertTrue(self.destalinator.has_prior_warning(messages))
+        self.assertFalse(self.destalinator.has_prior_warning(messages[:-1]))
+
+    def test_records_keep_what_activity_checks_read(self):
+        human, bot = records(sample_slack_messages[:2])
+        self.assertEqual((human.user, human.subtype, human.has_text), ('U2147483697', None, True))
+        self.assertEqual((bot.get('subtype'), bot.get('username'), bot.get('text', 'missing')), ('bot_message', None, 'missing'))
+        dolphin = MessageRecord.from_message({'text': 'a :dolphin: here', 'ts': '1.5'})
+        self.assertEqual((dolphin.ts, dolphin.has_text), (1.5, False))
+        self.assertFalse(hasattr(human, '__dict__'))
+
+    def test_warning_text_marks_a_warning(self):
+        self.destalinator = destalinator.Destalinator(self.slacker, self.slackbot, activated=True)
+        self.slacker.channels_by_name = {}
+        warning = self.destalinator.add_slack_channel_markup(self.destalinator.warning_text)
+        self.assertTrue(MessageRecord.from_message({'text': warning + "\n"}, warning).is_warning)
+        self.assertFalse(MessageRecord.from_message({'text': warning + " and more"}, warning).is_warning)
+
+
+class DestalinatorHistoryCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.slackbot = slackbot.Slackbot("testing", "token")
+        self.day = 86400
+
+    def history(self, now):
+        """Messages posted 1, 20 and 45 days before `now`, newest first as Slack streams them."""
+        return [{"type": "message", "user": "U2147483697", "text": "Hi", "ts": "{}.000001".format(now - days * self.day)}
+                for days in (1, 20, 45)]
+
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_narrower_window_reuses_wider_fetch(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channelid.return_value = "C1"
+        mock_slacker.get_messages_in_time_range.side_effect = lambda oldest, cid, latest, lazy: \
+            iter([m for m in self.history(self.destalinator.now) if float(m['ts']) >= oldest])
+        self.assertEqual(len(self.destalinator.get_messages("general", 60)), 3)
+        self.assertEqual(len(self.destalinator.get_messages("general", 30)), 2)
+        self.assertEqual(mock_slacker.get_messages_in_time_range.call_count, 1)
+
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_wider_window_fetches_only_older_part(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channelid.return_value = "C1"
+        mock_slacker.get_messages_in_time_range.side_effect = lambda oldest, cid, latest, lazy: \
+            iter([m for m in self.history(self.destalinator.now) if oldest <= float(m['ts']) < latest])
+        self.destalinator.get_messages("general", 30)
+        self.assertEqual(len(self.destalinator.get_messages("general", 60)), 3)
+        now = self.destalinator.now
+        self.assertEqual([c[0][::2] for c in mock_slacker.get_messages_in_time_range.call_args_list],
+                         [(now - 30 * self.day, now), (now - 60 * self.day, now - 30 * self.day)])
+
+    @mock.patch('tests.test_destalinator.SlackerMock')
+    def test_partly_read_history_is_cached(self, mock_slacker):
+        self.destalinator = destalinator.Destalinator(mock_slacker, self.slackbot, activated=True)
+        mock_slacker.get_channelid.return_value = "C1"
+        mock_slacker.get_channel_info.return_value = {'age': 90 * self.day}
+        mock_slacker.channel_has_only_restricted_members.return_value = False
+        mock_slacker.iter_messages_in_time_range.side_effect = lambda oldest, cid, latest: \
+            iter([m for m in self.history(self.destalinator.now) if oldest <= float(m['ts'])])
+        self.assertFalse(self.destalinator.stale("general", 60))
+        self.assertFalse(self.destalinator.stale("general", 30))
+        self.assertEqual(mock_slacker.iter_messages_in_time_range.call_count, 1)
@@ -0,0 +1,46 @@
+import collections
+import unittest
+
+from flag_rules import FlagRules
+
+
+def rule(emoji, comparator, threshold, output='flagged'):
+    return {'emoji': emoji, 'comparator': comparator, 'threshold': threshold, 'output': output}
+
+
+def reaction(name, count):
+    return {'name': name, 'count': count}
+
+
+class FlagRulesTest(unittest.TestCase):
+    def test_comparators(self):
+        control = {'ge': rule('fire', '>=', 3), 'gt': rule('fire', '>', 3), 'eq': rule('fire', '==', 3),
+                   'le': rule('fire', '<=', 3), 'lt': rule('fire', '<', 3)}
+        rules = FlagRules(control, {})
+        matched = {
+            count: sorted(uuid for uuid, r in control.items() if r in rules.destinations([reaction('fire', count)]))
+            for count in (2, 3, 4)
+        }
+        self.assertEqual(matched, {2: ['le', 'lt'], 3: ['eq', 'ge', 'le'], 4: ['ge', 'gt']})
+
+    def test_thresholds_within_a_comparator(self):
+        control = collections.OrderedDict([('one', rule('fire', '>=', 1)), ('five', rule('fire', '>=', 5)),
+                                           ('ten', rule('fire', '>=', 10))])
+        rules = FlagRules(control, {})
+        self.assertEqual(rules.destinations([reaction('fire', 7)]), [control['one'], control['five']])
+
+    def test_aliases_count_towards_rule_emoji(self):
+        rules = FlagRules({'save': rule('floppy_disk', '>=', 3)}, {'floppy_disk': ['save'], 'save': ['floppy_disk']})
+        self.assertEqual(rules.destinations([reaction('save', 2)]), [])
+        self.assertEqual(len(rules.destinations([reaction('save', 2), reaction('floppy_disk', 1)])), 1)
+
+    def test_unrelated_reactions_are_ignored(self):
+        rules = FlagRules({'fire': rule('fire', '<', 5)}, {})
+        self.assertEqual(rules.destinations([reaction('tada', 1)]), [])
+
+    def test_destinations_follow_control_order(self):
+        control = collections.OrderedDict([('a', rule('fire', '>=', 9, 'a')), ('b', rule('tada', '>=', 1, 'b')),
+                                           ('c', rule('fire', '>=', 1, 'c'))])
+        rules = FlagRules(control, {})
+        destinations = rules.destinations([reaction('tada', 10), reaction('fire', 10)])
+        self.assertEqual(destinations, list(control.values()))
@@ -1,10 +1,16 @@
 import os
+import time
 import unittest
 import mock
 
+from config import get_config
 import flagger
+from flagger_state import FlaggerState
+import slacker
 import tests.fixtures as fixtures
 import tests.mocks as mocks
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
 
 
 class FlaggerFlagTest(unittest.TestCase):
@@ -15,8 +21,116 @@ class FlaggerFlagTest(unittest.TestCase):
                                                   emoji_list=fixtures.emoji)
         self.slackbot = mocks.mocked_slackbot_object()
         with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true'}):
+            get_config().reload()
+            self.addCleanup(get_config().reload)
             self.flagger = flagger.Flagger(slacker_injected=slacker_obj, slackbot_injected=self.slackbot)
 
     def test_flag_posts_interesting_messages(self):
         self.flagger.flag()
         self.assertGreater(len(self.slackbot.say.mock_calls), 0)
+
+
+class FlaggerOrderTest(unittest.TestCase):
+    def setUp(self):
+        now = int(time.time())
+        channels = [{'id': 'C01', 'name': 'trotskyists', 'created': 0},
+                    {'id': 'C02', 'name': get_config().control_channel, 'created': 0},
+                    {'id': 'C03', 'name': 'gorbavites', 'created': 0}]
+        rule = {'type': 'message', 'user': 'U023BECGF', 'ts': '1.000000',
+                'text': 'flag content rule saver >1 :floppy_disk: <#C03|gorbavites>'}
+        saved = [{'type': 'message', 'user': 'U023BECGF', 'text': text, 'ts': '{}.000100'.format(now - age),
+                  'reactions': [{'name': 'floppy_disk', 'count': 2}]}
+                 for text, age in (('first', 3600), ('second', 1800), ('third', 60))]
+        self.server = FakeSlack(channels=channels, users=fixtures.users, messages={'C01': saved, 'C02': [rule]}).start()
+        self.addCleanup(self.server.stop)
+        slacker_obj = slacker.Slacker('testing', 'token', init=False,
+                                      rate_limiter=RateLimiter({'default': {'per_minute': 10 ** 9}}))
+        slacker_obj.url = self.server.api_url
+        slacker_obj.get_users()
+        slacker_obj.get_channels()
+        self.slackbot = mocks.mocked_slackbot_object()
+        with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true'}):
+            get_config().reload()
+        self.addCleanup(get_config().reload)
+        self.flagger = flagger.Flagger(slacker_injected=slacker_obj, slackbot_injected=self.slackbot)
+
+    def test_messages_are_announced_in_the_order_posted(self):
+        self.flagger.flag()
+        said = [c[0][1] for c in self.slackbot.say.call_args_list]
+        self.assertEqual([text.split("_'")[1].split("'_")[0] for text in said], ['first', 'second', 'third'])
+
+
+class FlaggerControlStateTest(unittest.TestCase):
+    def setUp(self):
+        self.control_messages = [
+            {'type': 'message', 'ts': '1498000000.000001', 'text': 'flag content rule saver >1 :floppy_disk: <#C0932792|gorbavites>'},
+            {'type': 'message', 'ts': '1498000100.000001', 'text': 'flag content rule fire >=3 :fire: <#C0932792|gorbavites>'},
+        ]
+        self.slacker = mocks.mocked_slacker_object(channels_list=fixtures.channels, users_list=fixtures.users,
+                                                   emoji_list=fixtures.emoji)
+        self.slacker.get_messages_in_time_range.side_effect = self.history
+        self.state = FlaggerState(':memory:')
+
+    def history(self, oldest, cid, latest=None, lazy=False):
+        return [x for x in self.control_messages if float(x['ts']) > float(oldest)]
+
+    def initialize_control(self, **kwargs):
+        f = flagger.Flagger(slacker_injected=self.slacker, slackbot_injected=mocks.mocked_slackbot_object(), **kwargs)
+        f.workspace.flagger_state = self.state
+        f.initialize_control()
+        return f
+
+    def test_later_runs_only_apply_new_control_messages(self):
+        self.initialize_control()
+        self.control_messages.append({'type': 'message', 'ts': '1498000200.000001', 'text': 'flag content rule fire delete'})
+        f = self.initialize_control()
+        self.assertEqual(self.slacker.get_messages_in_time_range.call_args[0][0], '1498000100.000001')
+        self.assertEqual(list(f.control), ['saver'])
+        self.assertEqual(f.control['saver']['comparator'], '>')
+
+    def test_rebuild_replays_the_whole_control_channel(self):
+        self.initialize_control()
+        self.control_messages.pop()
+        f = self.initialize_control(rebuild_control=True)
+        self.assertEqual(self.slacker.get_messages_in_time_range.call_args[0][0], 0)
+        self.assertEqual(list(f.control), ['saver'])
+
+
+class FlaggerScanStateTest(unittest.TestCase):
+    def setUp(self):
+        self.slacker = mocks.mocked_slacker_object(channels_list=fixtures.channels, users_list=fixtures.users,
+                                                   emoji_list=fixtures.emoji)
+        self.slacker.get_messages_in_time_range.side_effect = self.history
+        self.state = FlaggerState(':memory:')
+        # from the last hour, so they are not pruned from the ledger as too old to be scanned again
+        hour_ago = int(time.time()) - 3600
+        self.messages = [dict(x, ts="{}.{:06d}".format(hour_ago, i)) for i, x in enumerate(fixtures.messages)]
+        with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true'}):
+            get_config().reload()
+        self.addCleanup(get_config().reload)
+
+    def history(self, oldest, cid, latest=None, lazy=False):
+        control_channel = get_config().control_channel
+        if cid == self.slacker.get_channelid(control_channel):
+            return [dict(x, channel=control_channel) for x in self.messages]
+        return [x for x in self.messages if self.slacker.get_channelid(x['channel']) == cid]
+
+    def flag(self):
+        slackbot = mocks.mocked_slackbot_object()
+        f = flagger.Flagger(slacker_injected=self.slacker, slackbot_injected=slackbot)
+        f.workspace.flagger_state = self.state
+        f.flag()
+        return f, slackbot
+
+    def test_messages_are_announced_once(self):
+        _, slackbot = self.flag()
+        self.assertGreater(len(slackbot.say.mock_calls), 0)
+        _, slackbot = self.flag()
+        self.assertEqual(len(slackbot.say.mock_calls), 0)
+
+    def test_later_runs_scan_from_the_checkpoint_less_the_overlap(self):
+        f, _ = self.flag()
+        cid = self.slacker.get_channelid('leninists')
+        self.assertEqual(self.state.get_checkpoint(cid), f.now)
+        self.assertEqual(f.scan_start(cid, f.now - 86400), f.now - get_config().flagger_scan_overlap)
+        self.assertEqual(f.scan_start('C0UNKNOWN', f.now - 86400), f.now - 86400)
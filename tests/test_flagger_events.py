@@ -0,0 +1,158 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+import unittest
+
+import mock
+
+from config import get_config
+import flagger
+from flagger_events import EventsApiSource, IterableEventSource, ReactionTallies
+import slacker
+import tests.fixtures as fixtures
+import tests.mocks as mocks
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+
+def reaction_event(event_type, cid, ts, name='floppy_disk'):
+    return {'type': event_type, 'reaction': name, 'item': {'type': 'message', 'channel': cid, 'ts': ts}}
+
+
+class FlaggerListenTest(unittest.TestCase):
+    def setUp(self):
+        self.now = int(time.time())
+        self.ts = '{}.000100'.format(self.now - 60)
+        channels = [{'id': 'C01', 'name': 'trotskyists', 'created': 0},
+                    {'id': 'C02', 'name': get_config().control_channel, 'created': 0},
+                    {'id': 'C03', 'name': 'gorbavites', 'created': 0}]
+        rule = {'type': 'message', 'user': 'U023BECGF', 'ts': '1.000000',
+                'text': 'flag content rule saver >1 :floppy_disk: <#C03|gorbavites>'}
+        self.message = {'type': 'message', 'user': 'U023BECGF', 'text': 'Flag me, please.', 'ts': self.ts,
+                        'reactions': [{'name': 'floppy_disk', 'count': 1}]}
+        self.server = FakeSlack(channels=channels, users=fixtures.users,
+                                messages={'C01': [self.message], 'C02': [rule]}).start()
+        self.addCleanup(self.server.stop)
+
+        self.slacker = slacker.Slacker('testing', 'token', init=False,
+                                       rate_limiter=RateLimiter({'default': {'per_minute': 10 ** 9}}))
+        self.slacker.url = self.server.api_url
+        self.slacker.get_users()
+        self.slacker.get_channels()
+        self.slackbot = mocks.mocked_slackbot_object()
+        with mock.patch.dict(os.environ, {'DESTALINATOR_ACTIVATED': 'true'}):
+            get_config().reload()
+        self.addCleanup(get_config().reload)
+        self.flagger = flagger.Flagger(slacker_injected=self.slacker, slackbot_injected=self.slackbot)
+
+    def reactions_get_calls(self):
+        return [params for method, params in self.server.calls if method == 'reactions.get']
+
+    def test_nothing_is_announced_until_a_rule_matches(self):
+        self.flagger.listen(IterableEventSource([reaction_event('reaction_added', 'C01', self.ts)]))
+        self.assertEqual(self.slackbot.say.call_count, 0)
+
+    def test_announces_once_a_rule_matches(self):
+        self.flagger.listen(IterableEventSource([reaction_event('reaction_added', 'C01', self.ts)] * 4))
+        self.assertEqual(self.slackbot.say.call_count, 1)
+        self.assertEqual(self.slackbot.say.call_args[0][0], '#gorbavites')
+        self.assertEqual(len(self.reactions_get_calls()), 1)
+
+    def test_reactions_are_tallied_after_the_first_fetch(self):
+        self.flagger.listen(IterableEventSource([
+            reaction_event('reaction_added', 'C01', self.ts),
+            reaction_event('reaction_removed', 'C01', self.ts),
+            reaction_event('reaction_added', 'C01', self.ts),
+            reaction_event('reaction_added', 'C01', self.ts),
+        ]))
+        self.assertEqual(self.slackbot.say.call_count, 1)
+        self.assertEqual(len(self.reactions_get_calls()), 1)
+
+    def test_control_messages_update_the_rules(self):
+        self.flagger.listen(IterableEventSource([
+            {'type': 'message', 'channel': 'C02', 'ts': '2.000000', 'text': 'flag content rule saver delete'},
+            reaction_event('reaction_added', 'C01', self.ts),
+            reaction_event('reaction_added', 'C01', self.ts),
+        ]))
+        self.assertEqual(self.slackbot.say.call_count, 0)
+
+    def test_bot_message_reactions_do_not_stop_the_listener(self):
+        bot_ts = '{}.000050'.format(self.now - 60)
+        self.server.messages['C01'].append({'type': 'message', 'subtype': 'bot_message', 'bot_id': 'B01',
+                                            'username': 'deploybot', 'ts': bot_ts,
+                                            'reactions': [{'name': 'floppy_disk', 'count': 2}]})
+        self.flagger.listen(IterableEventSource([
+            reaction_event('reaction_added', 'C01', bot_ts),
+            reaction_event('reaction_added', 'C01', 'not-a-ts'),
+            reaction_event('reaction_added', 'C01', self.ts),
+            reaction_event('reaction_added', 'C01', self.ts),
+        ]))
+        said = [c[0] for c in self.slackbot.say.call_args_list]
+        self.assertEqual([channel for channel, _ in said], ['#gorbavites', '#gorbavites'])
+        self.assertIn('*@deploybot*', said[0][1])
+        self.assertIn('Flag me, please.', said[1][1])
+
+    def test_old_and_unknown_messages_are_ignored(self):
+        self.flagger.listen(IterableEventSource([
+            reaction_event('reaction_added', 'C01', '{}.000100'.format(self.now - 2 * 86400)),
+            reaction_event('reaction_added', 'D01', self.ts),
+        ]))
+        self.assertEqual(self.reactions_get_calls(), [])
+
+
+class ReactionTalliesTest(unittest.TestCase):
+    def test_react_counts_up_and_down(self):
+        tallies = ReactionTallies()
+        tallies.add(('C01', '100.0'), {'ts': '100.0', 'reactions': [{'name': 'fire', 'count': 1}]})
+        tallies.react(('C01', '100.0'), 'tada', 1)
+        tallies.react(('C01', '100.0'), 'fire', -1)
+        self.assertEqual(tallies.get(('C01', '100.0'))['reactions'], [{'name': 'tada', 'count': 1}])
+
+    def test_messages_are_evicted_after_ttl(self):
+        tallies = ReactionTallies(ttl=50)
+        tallies.add(('C01', '100.0'), {'ts': '100.0'})
+        tallies.add(('C01', '120.0'), {'ts': '120.0'})
+        tallies.evict(160)
+        self.assertIsNone(tallies.get(('C01', '100.0')))
+        self.assertIsNotNone(tallies.get(('C01', '120.0')))
+        self.assertNotIn(('C01', '100.0'), tallies.announced)
+
+
+class EventsApiSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.source = EventsApiSource(0, signing_secret='secret', host='127.0.0.1')
+        self.addCleanup(self.source.close)
+
+    def signed(self, body, timestamp=None):
+        timestamp = str(int(timestamp or time.time()))
+        signature = hmac.new(b'secret', b'v0:' + timestamp.encode('utf-8') + b':' + body, hashlib.sha256).hexdigest()
+        return {'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': 'v0=' + signature}
+
+    def test_answers_url_verification(self):
+        body = json.dumps({'type': 'url_verification', 'challenge': 'abc'}).encode('utf-8')
+        self.assertEqual(self.source.receive(body, self.signed(body)), (200, 'abc'))
+
+    def test_queues_events(self):
+        event = reaction_event('reaction_added', 'C01', '100.0')
+        body = json.dumps({'type': 'event_callback', 'event': event}).encode('utf-8')
+        self.assertEqual(self.source.receive(body, self.signed(body))[0], 200)
+        self.assertEqual(self.source.events.get_nowait(), event)
+
+    def test_drops_redelivered_events(self):
+        self.source.max_seen_events = 2
+        events = [reaction_event('reaction_added', 'C01', ts) for ts in ('100.0', '101.0', '102.0')]
+        bodies = [json.dumps({'type': 'event_callback', 'event_id': 'Ev{}'.format(i), 'event': event}).encode('utf-8')
+                  for i, event in enumerate(events)]
+        for body, retry in ((bodies[0], None), (bodies[1], None), (bodies[0], '1'), (bodies[2], None), (bodies[0], '2')):
+            headers = dict(self.signed(body), **({'X-Slack-Retry-Num': retry} if retry else {}))
+            self.assertEqual(self.source.receive(body, headers)[0], 200)
+        queued = [self.source.events.get_nowait() for _ in range(self.source.events.qsize())]
+        # Ev0 is forgotten once Ev2 fills the window of two, so its last redelivery gets through again
+        self.assertEqual(queued, [events[0], events[1], events[2], events[0]])
+
+    def test_rejects_bad_and_stale_signatures(self):
+        body = json.dumps({'type': 'url_verification', 'challenge': 'abc'}).encode('utf-8')
+        self.assertEqual(self.source.receive(body, dict(self.signed(body), **{'X-Slack-Signature': 'v0=00'}))[0], 401)
+        self.assertEqual(self.source.receive(body, self.signed(body, time.time() - 3600))[0], 401)
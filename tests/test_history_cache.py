@@ -0,0 +1,56 @@
+import unittest
+
+from message_record import MessageRecord
+from utils.history_cache import HistoryCache
+
+
+def records(*timestamps):
+    return [MessageRecord(ts=ts) for ts in timestamps]
+
+
+def timestamps(messages):
+    return [m.ts for m in messages]
+
+
+class HistoryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = HistoryCache(max_records=10)
+
+    def test_missing_key_needs_the_whole_range(self):
+        self.assertEqual(self.cache.lookup('C1', 100, 200), (None, [], (100, 200)))
+
+    def test_narrower_range_is_answered_from_memory(self):
+        self.cache.add('C1', 100, 200, records(110, 150, 190))
+        self.assertEqual(self.cache.lookup('C1', 100, 200)[::2], (None, None))
+        older, cached, newer = self.cache.lookup('C1', 140, 190)
+        self.assertEqual((older, timestamps(cached), newer), (None, [150, 190], None))
+
+    def test_wider_range_needs_only_the_missing_ends(self):
+        self.cache.add('C1', 100, 200, records(110, 150, 190))
+        older, cached, newer = self.cache.lookup('C1', 50, 250)
+        self.assertEqual((older, timestamps(cached), newer), ((50, 100), [110, 150, 190], (200, 250)))
+
+        self.cache.add('C1', 50, 100, records(60, 100))
+        self.cache.add('C1', 200, 250, records(200, 240))
+        older, cached, newer = self.cache.lookup('C1', 50, 250)
+        self.assertEqual((older, timestamps(cached), newer), (None, [60, 110, 150, 190, 240], None))
+
+    def test_disjoint_range_replaces_cached_one(self):
+        self.cache.add('C1', 100, 200, records(110))
+        self.cache.add('C1', 300, 400, records(310))
+        self.assertEqual(self.cache.lookup('C1', 100, 200), (None, [], (100, 200)))
+        self.assertEqual(timestamps(self.cache.lookup('C1', 300, 400)[1]), [310])
+
+    def test_least_recently_used_keys_are_evicted(self):
+        self.cache.add('C1', 0, 10, records(*range(4)))
+        self.cache.add('C2', 0, 10, records(*range(4)))
+        self.cache.lookup('C1', 0, 10)
+        self.cache.add('C3', 0, 10, records(*range(4)))
+        self.assertEqual(list(self.cache.spans), ['C1', 'C3'])
+        self.assertEqual(self.cache.size, 8)
+
+    def test_most_recent_key_is_kept_even_when_too_large(self):
+        self.cache.add('C1', 0, 10, records(*range(4)))
+        self.cache.add('C2', 0, 100, records(*range(20)))
+        self.assertEqual(list(self.cache.spans), ['C2'])
+        self.assertEqual(self.cache.size, 20)
@@ -0,0 +1,46 @@
+import unittest
+
+from ignore_rules import IgnoreRules
+
+
+class IgnoreRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = IgnoreRules(ignore_channels=['stale-channels'],
+                                 ignore_channel_patterns=['^zmeta-', 'rands', 'ists$'],
+                                 ignore_users=['USLACKBOT', 'destalinator'],
+                                 included_subtypes=['bot_message'])
+
+    def test_ignores_listed_and_matching_channels(self):
+        self.assertTrue(self.rules.ignore_channel('stale-channels'))
+        self.assertTrue(self.rules.ignore_channel('zmeta-control'))
+        self.assertTrue(self.rules.ignore_channel('errands'))
+        self.assertTrue(self.rules.ignore_channel('leninists'))
+        self.assertFalse(self.rules.ignore_channel('general'))
+
+    def test_patterns_keep_their_own_flags_and_groups(self):
+        rules = IgnoreRules(ignore_channel_patterns=['^zmeta-', '(?i)^test', r'^(\w)\1'])
+        self.assertTrue(rules.ignore_channel('TEST-deploys'))
+        self.assertFalse(rules.ignore_channel('ZMETA-control'))
+        self.assertTrue(rules.ignore_channel('eek'))
+        self.assertFalse(rules.ignore_channel('ek'))
+
+    def test_ignores_users_by_id_or_username(self):
+        self.assertTrue(self.rules.ignore_user({'user': 'USLACKBOT'}))
+        self.assertTrue(self.rules.ignore_user({'username': 'destalinator'}))
+        self.assertFalse(self.rules.ignore_user({'user': 'U012742'}))
+
+    def test_included_subtypes(self):
+        self.assertTrue(self.rules.included_subtype({}))
+        self.assertTrue(self.rules.included_subtype({'subtype': 'bot_message'}))
+        self.assertFalse(self.rules.included_subtype({'subtype': 'channel_join'}))
+
+    def test_single_values_from_environment_are_not_split_into_characters(self):
+        rules = IgnoreRules(ignore_channels='general', ignore_users='USLACKBOT')
+        self.assertTrue(rules.ignore_channel('general'))
+        self.assertFalse(rules.ignore_channel('g'))
+        self.assertFalse(rules.ignore_user({'user': 'U'}))
+
+    def test_empty_settings_ignore_nothing(self):
+        rules = IgnoreRules(ignore_channels='', ignore_channel_patterns='', ignore_users='', included_subtypes='')
+        self.assertFalse(rules.ignore_channel('general'))
+        self.assertFalse(rules.included_subtype({'subtype': 'bot_message'}))
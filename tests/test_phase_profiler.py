@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.api_metrics import ApiMetrics
+from utils.phase_profiler import PhaseProfiler
+
+
+class PhaseProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'profiles')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.directory))
+        self.metrics = ApiMetrics()
+        self.profiler = PhaseProfiler(self.directory, self.metrics)
+
+    def test_writes_a_profile_per_phase_and_a_summary(self):
+        with self.profiler.phase('archive'):
+            self.metrics.record('channels.history', 0.25)
+            self.metrics.record('channels.history', 0.5)
+        with self.profiler.phase('warn'):
+            sum(range(1000))
+        self.profiler.write_summary()
+
+        run = self.profiler.run
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [run + '-archive.prof', run + '-summary.txt', run + '-warn.prof'])
+        self.assertEqual(self.metrics.to_dict()['phases'], {'archive': {'channels.history': 2}})
+        name, _, _, http, calls = self.profiler.rows[0]
+        self.assertEqual((name, http, calls), ('archive', 0.75, 2))
+        with open(os.path.join(self.directory, run + '-summary.txt')) as f:
+            lines = f.read().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['phase', 'archive', 'warn'])
+
+    def test_phase_is_recorded_when_it_fails(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.phase('flag'):
+                raise ValueError()
+        self.assertEqual([row[0] for row in self.profiler.rows], ['flag'])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, self.profiler.run + '-flag.prof')))
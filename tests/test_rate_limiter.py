@@ -0,0 +1,46 @@
+import unittest
+
+import mock
+
+from utils.rate_limiter import RateLimiter
+
+LIMITS = {
+    'default': {'tier': 3},
+    'users.list': {'tier': 2, 'burst': 2},
+    'chat.postMessage': {'per_minute': 60, 'per_channel': True},
+}
+
+
+@mock.patch('time.time', return_value=1000.0)
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(LIMITS)
+
+    def test_spaces_calls_by_tier(self, _):
+        self.assertEqual(self.limiter.reserve('channels.history'), 0)
+        self.assertAlmostEqual(self.limiter.reserve('channels.history'), 60.0 / 50)
+        self.assertAlmostEqual(self.limiter.reserve('channels.history'), 2 * 60.0 / 50)
+
+    def test_allows_configured_burst(self, _):
+        self.assertEqual(self.limiter.reserve('users.list'), 0)
+        self.assertEqual(self.limiter.reserve('users.list'), 0)
+        self.assertAlmostEqual(self.limiter.reserve('users.list'), 60.0 / 20)
+
+    def test_methods_have_separate_budgets(self, _):
+        self.assertEqual(self.limiter.reserve('channels.history'), 0)
+        self.assertEqual(self.limiter.reserve('channels.info'), 0)
+
+    def test_per_channel_budgets(self, _):
+        self.assertEqual(self.limiter.reserve('chat.postMessage', 'leninists'), 0)
+        self.assertEqual(self.limiter.reserve('chat.postMessage', 'stalinists'), 0)
+        self.assertAlmostEqual(self.limiter.reserve('chat.postMessage', 'leninists'), 1.0)
+
+    def test_budget_refills_over_time(self, mock_time):
+        self.limiter.reserve('channels.history')
+        mock_time.return_value = 1000.0 + 60.0 / 50
+        self.assertAlmostEqual(self.limiter.reserve('channels.history'), 0)
+
+    def test_pause_holds_back_method(self, _):
+        self.limiter.pause('channels.history', 30)
+        self.assertAlmostEqual(self.limiter.reserve('channels.history'), 30)
+        self.assertEqual(self.limiter.reserve('channels.info'), 0)
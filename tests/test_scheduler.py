@@ -0,0 +1,63 @@
+import os
+import unittest
+
+import mock
+
+from config import get_config
+import scheduler
+
+
+class DestalinateAllTest(unittest.TestCase):
+    def setUp(self):
+        self.runs = []
+        patcher = mock.patch('scheduler.destalinate_job', side_effect=self.record_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep = mock.patch('scheduler.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def record_run(self, profile_dir=None):
+        config = get_config()
+        if config.slack_name == 'broken':
+            raise RuntimeError("boom")
+        self.runs.append((config.slack_name, config.api_token, config.archive_threshold, config.log_to_channel, profile_dir))
+
+    def test_single_workspace_uses_top_level_settings(self):
+        scheduler.destalinate_all()
+        self.assertEqual(self.runs, [(get_config().slack_name, get_config().api_token, get_config().archive_threshold,
+                                      get_config().log_to_channel, None)])
+
+    @mock.patch.dict(os.environ, {'ACME_API_TOKEN': 'acme-token'})
+    def test_each_workspace_runs_with_its_own_settings(self):
+        workspaces = ({'slack_name': 'acme', 'api_token': '${ACME_API_TOKEN}'},
+                      {'slack_name': 'broken'},
+                      {'slack_name': 'initech', 'api_token': 'initech-token', 'archive_threshold': 90})
+        with mock.patch.object(get_config(), 'workspaces', workspaces), \
+                mock.patch.object(get_config(), 'workspace_workers', 1), \
+                mock.patch.object(get_config(), 'workspace_stagger', 30):
+            scheduler.destalinate_all(profile_dir='/tmp/profiles')
+        self.assertEqual(self.runs, [
+            ('acme', 'acme-token', get_config().archive_threshold, False, os.path.join('/tmp/profiles', 'acme')),
+            ('initech', 'initech-token', 90, False, os.path.join('/tmp/profiles', 'initech')),
+        ])
+        self.assertEqual([c[0][0] for c in self.sleep.call_args_list], [30, 30])
+
+    def test_each_workspace_writes_its_own_files(self):
+        paths = {}
+
+        def record_paths(profile_dir=None):
+            config = get_config()
+            paths[config.slack_name] = (config.metrics_path, config.flagger_state_path, config.activity_index_path)
+
+        workspaces = ({'slack_name': 'acme'}, {'slack_name': 'initech', 'flagger_state_path': '/data/initech.db'})
+        top_level = {'metrics_path': '/metrics/destalinator.prom', 'flagger_state_path': '/data/flagger.db'}
+        with get_config().override(top_level), \
+                mock.patch.object(get_config(), 'workspaces', workspaces), \
+                mock.patch.object(get_config(), 'workspace_stagger', 0), \
+                mock.patch('scheduler.destalinate_job', side_effect=record_paths):
+            scheduler.destalinate_all()
+        self.assertEqual(paths, {
+            'acme': ('/metrics/destalinator-acme.prom', '/data/flagger-acme.db', ''),
+            'initech': ('/metrics/destalinator-initech.prom', '/data/initech.db', ''),
+        })
@@ -0,0 +1,70 @@
+import logging
+import threading
+import unittest
+
+import mock
+
+# support Python 2 and 3's versions of this module
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from utils.slack_logging import SlackHandler
+
+
+def record(message):
+    return logging.LogRecord('test', logging.WARNING, __file__, 1, message, None, None)
+
+
+class SlackHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.slackbot = mock.MagicMock()
+        self.handler = SlackHandler(slackbot=self.slackbot, level=logging.DEBUG)
+        self.addCleanup(self.handler.flush)
+
+    def posted(self):
+        return [c[0][1] for c in self.slackbot.say.call_args_list]
+
+    def test_records_are_coalesced_into_one_message(self):
+        for i in range(3):
+            self.handler.emit(record("line {}".format(i)))
+        self.handler.flush()
+        self.assertEqual(self.posted(), ["line 0\nline 1\nline 2"])
+
+    @mock.patch.object(SlackHandler, 'max_message_length', 12)
+    def test_messages_are_split_at_the_length_limit(self):
+        for i in range(3):
+            self.handler.emit(record("line {}".format(i)))
+        self.handler.flush()
+        self.assertEqual(self.posted(), ["line 0", "line 1", "line 2"])
+
+    @mock.patch.object(SlackHandler, 'flush_interval', 0)
+    def test_emit_does_not_wait_for_slack(self):
+        posting = threading.Event()
+        release = threading.Event()
+
+        def slow_say(channel, text):
+            posting.set()
+            release.wait()
+
+        self.slackbot.say.side_effect = slow_say
+        self.handler.emit(record("first"))
+        posting.wait()
+        self.handler.emit(record("second"))  # returns while the first post is still in flight
+        release.set()
+        self.handler.flush()
+        self.assertEqual(self.posted(), ["first", "second"])
+
+    def test_records_beyond_the_queue_are_dropped_and_counted(self):
+        self.handler.start = mock.MagicMock()  # nothing drains the queue
+        self.handler.records = queue.Queue(2)
+        for i in range(5):
+            self.handler.emit(record("line {}".format(i)))
+        self.assertEqual(self.handler.dropped, 3)
+
+    def test_dropped_records_are_summarized(self):
+        self.handler.dropped = 4
+        self.handler.post(["kept"])
+        self.assertEqual(self.posted(), ["kept\n(4 more log records were dropped)"])
+        self.assertEqual(self.handler.dropped, 0)
@@ -0,0 +1,71 @@
+import unittest
+
+import mock
+import requests
+
+import slackbot
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+
+class SlackbotTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSlack().start()
+        self.addCleanup(self.server.stop)
+        self.slackbot = slackbot.Slackbot('testing', 'token', rate_limiter=RateLimiter({'default': {'per_minute': 10 ** 9}}))
+        self.slackbot.url = self.server.slackbot_url
+
+    def say_calls(self):
+        return [c for c in self.server.calls if c[0] == 'slackbot.say']
+
+    def test_say_posts_to_channel(self):
+        self.assertEqual(self.slackbot.say('#general', 'Hello'), 200)
+        self.assertEqual(self.server.posts, [('general', 'Hello')])
+
+    def test_say_waits_out_retry_after(self):
+        self.server.failures['slackbot.say'] = [(429, {'Retry-After': '0'})]
+        with mock.patch.object(self.slackbot.rate_limiter, 'pause', wraps=self.slackbot.rate_limiter.pause) as pause:
+            self.assertEqual(self.slackbot.say('general', 'Hello'), 200)
+        pause.assert_called_once_with('slackbot.say', 0, 'general')
+        self.assertEqual(self.server.posts, [('general', 'Hello')])
+        self.assertEqual(len(self.say_calls()), 2)
+
+    @mock.patch('slackbot.time.sleep')
+    def test_say_does_not_retry_server_errors(self, sleep):
+        # the statement may have been posted before the error, so retrying could say it twice
+        self.server.failures['slackbot.say'] = [(503, {})]
+        self.assertEqual(self.slackbot.say('general', 'Hello'), 503)
+        self.assertEqual(len(self.say_calls()), 1)
+        self.assertFalse(sleep.called)
+
+    @mock.patch('slackbot.time.sleep')
+    def test_say_retries_connect_timeouts_only(self, sleep):
+        post = self.slackbot.session.post
+        failures = []
+
+        def flaky_post(url, **kwargs):
+            if failures:
+                raise failures.pop()
+            return post(url, **kwargs)
+
+        with mock.patch.object(self.slackbot.session, 'post', side_effect=flaky_post):
+            failures.append(requests.exceptions.ConnectTimeout())
+            self.assertEqual(self.slackbot.say('general', 'Hello'), 200)
+            # a connection dropped after connecting may have delivered the statement already
+            failures.append(requests.exceptions.ConnectionError())
+            self.assertRaises(requests.exceptions.ConnectionError, self.slackbot.say, 'general', 'Again')
+        self.assertEqual(self.server.posts, [('general', 'Hello')])
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [5])
+
+    @mock.patch('slackbot.time.sleep')
+    def test_say_does_not_retry_client_errors(self, sleep):
+        self.server.failures['slackbot.say'] = [(404, {})]
+        self.assertEqual(self.slackbot.say('general', 'Hello'), 404)
+        self.assertEqual(len(self.say_calls()), 1)
+        self.assertFalse(sleep.called)
+
+    def test_say_many_keeps_each_channels_order(self):
+        messages = [('general', 'one'), ('random', 'a'), ('general', 'two'), ('random', 'b'), ('general', 'three')]
+        self.assertEqual(self.slackbot.say_many(messages), [200] * 5)
+        self.assertEqual([text for channel, text in self.server.posts if channel == 'general'], ['one', 'two', 'three'])
+        self.assertEqual([text for channel, text in self.server.posts if channel == 'random'], ['a', 'b'])
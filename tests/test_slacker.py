@@ -0,0 +1,163 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from config import get_config
+import slacker
+import tests.fixtures as fixtures
+import tests.mocks as mocks
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+
+def channel_info_response(channel):
+    return {'ok': True, 'channel': dict(channel, members=['U012742'])}
+
+
+class SlackerChannelInfoTest(unittest.TestCase):
+    def setUp(self):
+        self.slacker = mocks.mocked_slacker_object(channels_list=fixtures.channels, users_list=fixtures.users)
+        self.channel = fixtures.channels[0]
+        self.slacker.get_with_retry_to_json = mock.MagicMock(return_value=channel_info_response(self.channel))
+        self.slacker.session = mock.MagicMock()
+
+    def test_repeated_lookups_make_one_request(self):
+        self.slacker.get_channel_info(self.channel['name'])
+        self.slacker.channel_has_only_restricted_members(self.channel['name'])
+        self.slacker.get_channel_member_names(self.channel['name'])
+        self.assertEqual(self.slacker.get_with_retry_to_json.call_count, 1)
+
+    def test_age_is_computed_on_every_lookup(self):
+        info = self.slacker.get_channel_info(self.channel['name'])
+        self.assertGreaterEqual(info['age'], int(time.time()) - self.channel['created'] - 1)
+        self.assertNotIn('age', self.slacker.channel_info_cache.entries[self.channel['id']][1])
+
+    def test_archive_invalidates_channel_info(self):
+        self.slacker.get_channel_info(self.channel['name'])
+        self.slacker.archive(self.channel['name'])
+        self.slacker.get_channel_info(self.channel['name'])
+        self.assertEqual(self.slacker.get_with_retry_to_json.call_count, 2)
+
+    def test_concurrent_lookups_share_one_request(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_response(url):
+            started.set()
+            release.wait()
+            return channel_info_response(self.channel)
+
+        self.slacker.get_with_retry_to_json = mock.MagicMock(side_effect=slow_response)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.slacker.get_channel_info(self.channel['name'])))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.slacker.get_with_retry_to_json.call_count, 1)
+
+
+class SlackerHistoryPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.channel = fixtures.channels[0]
+        start = int(time.time()) - 86400
+        self.messages = [{'type': 'message', 'user': 'U012742', 'text': 'Hi', 'ts': '{}.000100'.format(start + i)}
+                         for i in range(450)]
+        self.server = FakeSlack(channels=[self.channel], users=fixtures.users,
+                                messages={self.channel['id']: self.messages}).start()
+        unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+        self.slacker = slacker.Slacker('testing', 'token', init=False, rate_limiter=unlimited)
+        self.slacker.url = self.server.api_url
+        self.slacker.get_channels()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def history_calls(self):
+        return [params for method, params in self.server.calls if method == 'channels.history']
+
+    @mock.patch.object(get_config(), 'history_page_size', 200)
+    def test_returns_whole_history_oldest_first(self):
+        messages = self.slacker.get_messages_in_time_range(0, self.channel['id'])
+        self.assertEqual([m['ts'] for m in messages], [m['ts'] for m in self.messages])
+        self.assertTrue(all(m['channel'] == self.channel['name'] for m in messages))
+        self.assertEqual([params['count'] for params in self.history_calls()], ['200'] * 3)
+
+    @mock.patch.object(get_config(), 'history_page_size', 100)
+    def test_lazy_iterator_fetches_pages_as_read(self):
+        messages = self.slacker.get_messages_in_time_range(0, self.channel['id'], lazy=True)
+        newest = [next(messages)['ts'] for _ in range(150)]
+        self.assertEqual(newest, [m['ts'] for m in reversed(self.messages)][:150])
+        self.assertEqual(len(self.history_calls()), 2)
+
+
+class SlackerDirectoryPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSlack(channels=fixtures.channels, users=fixtures.users).start()
+        unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+        self.slacker = slacker.Slacker('testing', 'token', init=False, rate_limiter=unlimited)
+        self.slacker.url = self.server.api_url
+
+    def tearDown(self):
+        self.server.stop()
+
+    def calls(self, method):
+        return [params for called, params in self.server.calls if called == method]
+
+    @mock.patch.object(get_config(), 'directory_page_size', 4)
+    def test_channels_are_fetched_page_by_page(self):
+        self.slacker.get_channels()
+        self.assertEqual(sorted(self.slacker.channels_by_name), sorted(c['name'] for c in fixtures.channels))
+        self.assertEqual([params.get('cursor') for params in self.calls('channels.list')], [None, '4'])
+
+    @mock.patch.object(get_config(), 'directory_page_size', 3)
+    def test_users_are_fetched_page_by_page(self):
+        self.slacker.get_users()
+        self.assertEqual(self.slacker.users_by_id, {u['id']: u['name'] for u in fixtures.users})
+        self.assertEqual(len(self.calls('users.list')), 2)
+
+    def test_channel_listing_keeps_only_summaries(self):
+        self.server.channels = [dict(fixtures.channels[0], members=['U012742'] * 1000)]
+        self.slacker.get_channels()
+        self.assertEqual(set(self.slacker.channel_objects[0]), set(slacker.CHANNEL_SUMMARY_KEYS))
+
+
+class SlackerChannelListingTest(unittest.TestCase):
+    def setUp(self):
+        listed = dict(fixtures.channels[0], members=['U012742', 'U023BEAD1'], num_members=2)
+        truncated = dict(fixtures.channels[1], members=['U012742'], num_members=40)
+        self.server = FakeSlack(channels=[listed, truncated], users=fixtures.users).start()
+        self.addCleanup(self.server.stop)
+        unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+        self.slacker = slacker.Slacker('testing', 'token', init=False, rate_limiter=unlimited)
+        self.slacker.url = self.server.api_url
+        self.slacker.get_users()
+        self.slacker.get_channels()
+        self.listed, self.truncated = listed, truncated
+
+    def info_calls(self):
+        return [params['channel'] for method, params in self.server.calls if method == 'channels.info']
+
+    def test_age_and_members_come_from_the_listing(self):
+        info = self.slacker.get_channel_info(self.listed['name'])
+        self.assertGreaterEqual(info['age'], int(time.time()) - self.listed['created'] - 1)
+        self.assertEqual(self.slacker.get_channel_members_ids(self.listed['name']), ['U012742', 'U023BEAD1'])
+        self.slacker.channel_has_only_restricted_members(self.listed['name'])
+        self.assertEqual(self.info_calls(), [])
+
+    def test_truncated_member_list_falls_back_to_channel_info(self):
+        self.slacker.get_channel_info(self.truncated['name'])
+        self.assertEqual(self.info_calls(), [self.truncated['id']])
+
+    @mock.patch.object(get_config(), 'channel_info_ttl', 60)
+    def test_stale_listing_falls_back_to_channel_info(self):
+        self.slacker.channels_listed_at -= 61
+        self.slacker.get_channel_info(self.listed['name'])
+        self.assertEqual(self.info_calls(), [self.listed['id']])
@@ -0,0 +1,41 @@
+import time
+import unittest
+
+import slacker
+from benchmarks.synthetic import SyntheticWorkspace
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+
+class SyntheticWorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.now = int(time.time())
+
+    def workspace(self, **kwargs):
+        return SyntheticWorkspace(channels=5, users=20, messages_per_channel=30, now=self.now, **kwargs)
+
+    def test_history_is_deterministic(self):
+        first, second = self.workspace(), self.workspace()
+        self.assertEqual(first.channels, second.channels)
+        self.assertEqual(first.messages.get('C0000003'), second.messages.get('C0000003'))
+        self.assertNotEqual(first.messages.get('C0000003'), self.workspace(seed=1).messages.get('C0000003'))
+
+    def test_special_channels_have_fixed_history(self):
+        synthetic = self.workspace(special_channels=('zmeta-control',))
+        self.assertEqual(synthetic.messages.get('C0000005'), None)
+        synthetic.add_messages('zmeta-control', [{'type': 'message', 'ts': '1.0', 'text': 'rule'}])
+        self.assertEqual(synthetic.messages.get('C0000005'), [{'type': 'message', 'ts': '1.0', 'text': 'rule'}])
+        self.assertEqual(synthetic.message_count, 5 * 30 + 1)
+
+    def test_fake_slack_serves_history(self):
+        synthetic = self.workspace()
+        server = FakeSlack(channels=synthetic.channels, users=synthetic.users, messages=synthetic.messages).start()
+        self.addCleanup(server.stop)
+        sl = slacker.Slacker('testing', 'token', init=False, rate_limiter=RateLimiter({'default': {'per_minute': 10 ** 9}}))
+        sl.url = server.api_url
+        sl.get_users()
+        sl.get_channels()
+        self.assertEqual(len(sl.channels_by_id), 5)
+        messages = sl.get_messages_in_time_range(0, 'C0000000')
+        self.assertEqual(len(messages), 30)
+        self.assertEqual([m['ts'] for m in messages], sorted(m['ts'] for m in synthetic.messages.get('C0000000')))
@@ -0,0 +1,71 @@
+import time
+import unittest
+
+import mock
+
+import archiver
+from config import get_config
+import slacker
+import warner
+import workspace
+import tests.fixtures as fixtures
+import tests.mocks as mocks
+from tests.fake_slack import FakeSlack
+from utils.rate_limiter import RateLimiter
+
+
+class WorkspaceSharingTest(unittest.TestCase):
+    def setUp(self):
+        self.slacker = mocks.mocked_slacker_object(channels_list=fixtures.channels, users_list=fixtures.users)
+        self.slackbot = mocks.mocked_slackbot_object()
+        self.workspace = workspace.Workspace(slackbot_injected=self.slackbot, slacker_injected=self.slacker)
+
+    def test_executors_share_the_workspace_snapshot(self):
+        archiver_obj = archiver.Archiver(workspace_injected=self.workspace)
+        warner_obj = warner.Warner(workspace_injected=self.workspace)
+        self.assertIs(archiver_obj.slacker, warner_obj.slacker)
+        self.assertIs(archiver_obj.slackbot, warner_obj.slackbot)
+        self.assertIs(archiver_obj.ds.cache, warner_obj.ds.cache)
+
+    def test_executors_do_not_refetch_directories(self):
+        archiver.Archiver(workspace_injected=self.workspace)
+        warner.Warner(workspace_injected=self.workspace)
+        self.assertEqual(self.slacker.iter_channel_objects.call_count, 1)
+        self.assertEqual(self.slacker.iter_user_objects.call_count, 1)
+
+
+class WorkspacePhasesTest(unittest.TestCase):
+    def setUp(self):
+        now = int(time.time())
+        old = now - 365 * 86400
+        self.channels = [
+            {'id': 'C1', 'name': 'abandoned', 'created': old, 'members': ['U012742']},
+            {'id': 'C2', 'name': 'quiet', 'created': old, 'members': ['U012742']},
+            {'id': 'C3', 'name': 'stale-channels', 'created': old, 'members': ['U012742']},
+        ]
+        messages = {'C2': [{'type': 'message', 'user': 'U012742', 'text': 'Hi', 'ts': '{}.000001'.format(now - 45 * 86400)}]}
+        self.server = FakeSlack(channels=self.channels, users=fixtures.users, messages=messages).start()
+        self.addCleanup(self.server.stop)
+        unlimited = RateLimiter({'default': {'per_minute': 10 ** 9}})
+        sl = slacker.Slacker('testing', 'token', init=False, rate_limiter=unlimited)
+        sl.url = self.server.api_url
+        sl.get_users()
+        sl.get_channels()
+        self.workspace = workspace.Workspace(slackbot_injected=mocks.mocked_slackbot_object(), slacker_injected=sl)
+
+    def posts_to(self, channel):
+        return [params['text'] for method, params in self.server.calls if method == 'chat.postMessage' and params['channel'] == channel]
+
+    @mock.patch.object(get_config(), 'activated', True)
+    @mock.patch.object(get_config(), 'ignore_channels', ['stale-channels'])
+    def test_archived_channels_are_not_warned(self):
+        archiver.Archiver(workspace_injected=self.workspace).archive()
+        warner.Warner(workspace_injected=self.workspace).warn()
+        self.assertEqual([cid for method, params in self.server.calls if method == 'channels.archive'
+                          for cid in [params['channel']]], ['C1'])
+        self.assertEqual(len(self.posts_to('abandoned')), 2)  # closure and member list, no warning
+        self.assertEqual(len(self.posts_to('quiet')), 1)
+        general = self.posts_to('stale-channels')
+        self.assertEqual(len(general), 1)
+        self.assertNotIn('abandoned', general[0])
+        self.assertNotIn('abandoned', self.workspace.slacker.channels_by_name)
@@ -0,0 +1,77 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import bind_config
+from utils.with_logger import capture_logs, replay_logs
+
+
+class Action(object):
+    """One call submitted to an ActionQueue, and its outcome once `done` is set."""
+    def __init__(self, key, function, args):
+        self.key = key
+        self.function = function
+        self.args = args
+        self.value = None
+        self.error = None
+        self.records = []
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.value = self.function(*self.args)
+        except Exception as e:  # pylint: disable=W0703
+            self.error = e
+        finally:
+            self.done.set()
+
+
+class ActionQueue(object):
+    """
+    Runs actions on a pool of `workers` threads, so actions for different keys (e.g. channels) overlap
+    while the actions for any one key run one at a time, in the order they were submitted.
+
+    Log output from each action is held back and replayed by `drain` in submission order. With one worker,
+    actions simply run as they are submitted.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.submitted = []
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def submit(self, key, function, *args):
+        action = Action(key, function, args)
+        self.submitted.append(action)
+        if self.pool is None:
+            action.run()
+            return action
+        with self.lock:
+            idle = key not in self.pending
+            self.pending.setdefault(key, collections.deque()).append(action)
+        if idle:
+            self.pool.submit(bind_config(self.run_key), key)
+        return action
+
+    def run_key(self, key):
+        while True:
+            with self.lock:
+                queued = self.pending[key]
+                if not queued:
+                    del self.pending[key]
+                    return
+                action = queued.popleft()
+            with capture_logs() as action.records:
+                action.run()
+
+    def drain(self):
+        """Wait for every submitted action, yielding each one (with `value` or `error` set) in submission order."""
+        try:
+            for action in self.submitted:
+                action.done.wait()
+                replay_logs(action.records)
+                yield action
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
@@ -0,0 +1,145 @@
+import contextlib
+import json
+import os
+import threading
+
+# Upper bounds (in seconds) of the request latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MethodStats(object):
+    """Running totals for one API method."""
+    def __init__(self):
+        self.calls = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.throttled_seconds = 0
+        self.latency_sum = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.latency_sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_counts[i] += 1
+                return
+        self.latency_counts[-1] += 1
+
+    def cumulative_buckets(self):
+        """Yield `(le, count)` for each latency bucket, counting every request at or below its bound."""
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.latency_counts):
+            total += count
+            yield str(bound), total
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'throttled_seconds': self.throttled_seconds,
+            'latency_seconds': {'sum': round(self.latency_sum, 6), 'buckets': dict(self.cumulative_buckets())},
+        }
+
+
+class ApiMetrics(object):
+    """
+    Thread-safe per-method counters for Slack API requests: calls, latency, bytes received, retries and
+    seconds held back by Retry-After, plus how many calls of each method were made in each phase of a run.
+    """
+    def __init__(self):
+        self.methods = {}
+        self.phases = {}
+        self.current_phase = None
+        self.lock = threading.Lock()
+
+    def stats_for(self, method):
+        if method not in self.methods:
+            self.methods[method] = MethodStats()
+        return self.methods[method]
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Attribute calls made inside this block (from any thread) to phase `name`."""
+        previous, self.current_phase = self.current_phase, name
+        try:
+            yield
+        finally:
+            self.current_phase = previous
+
+    def record(self, method, seconds, bytes_received=0):
+        """Count a completed request to `method` that took `seconds` and returned `bytes_received`."""
+        with self.lock:
+            stats = self.stats_for(method)
+            stats.calls += 1
+            stats.bytes_received += bytes_received
+            stats.observe(seconds)
+            if self.current_phase is not None:
+                calls = self.phases.setdefault(self.current_phase, {})
+                calls[method] = calls.get(method, 0) + 1
+
+    def record_retry(self, method, throttled_seconds=0):
+        """Count a retried request to `method`, and any seconds Slack asked us to wait before retrying."""
+        with self.lock:
+            stats = self.stats_for(method)
+            stats.retries += 1
+            stats.throttled_seconds += throttled_seconds
+
+    def totals(self):
+        """Return `(calls, seconds)`: requests made so far, and the time spent waiting on them summed over threads."""
+        with self.lock:
+            return (sum(stats.calls for stats in self.methods.values()),
+                    sum(stats.latency_sum for stats in self.methods.values()))
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'methods': {method: stats.to_dict() for method, stats in self.methods.items()},
+                'phases': {phase: dict(calls) for phase, calls in self.phases.items()},
+            }
+
+    def to_prometheus(self):
+        """Render the totals in the Prometheus text exposition format, e.g. for node_exporter's textfile collector."""
+        with self.lock:
+            methods = sorted(self.methods.items())
+            phases = sorted(self.phases.items())
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append("# HELP destalinator_{} {}".format(name, description))
+            lines.append("# TYPE destalinator_{} {}".format(name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(k, v) for k, v in labels)
+                lines.append("destalinator_{}{}{{{}}} {}".format(name, suffix, label_text, value))
+
+        metric('api_calls_total', 'counter', 'Slack API requests made.',
+               [('', [('method', m)], s.calls) for m, s in methods])
+        metric('api_response_bytes_total', 'counter', 'Bytes received from the Slack API.',
+               [('', [('method', m)], s.bytes_received) for m, s in methods])
+        metric('api_retries_total', 'counter', 'Slack API requests retried.',
+               [('', [('method', m)], s.retries) for m, s in methods])
+        metric('api_throttled_seconds_total', 'counter', 'Seconds Slack asked us to wait (Retry-After) before retrying.',
+               [('', [('method', m)], s.throttled_seconds) for m, s in methods])
+        latency = []
+        for m, s in methods:
+            latency.extend(('_bucket', [('method', m), ('le', le)], count) for le, count in s.cumulative_buckets())
+            latency.append(('_sum', [('method', m)], round(s.latency_sum, 6)))
+            latency.append(('_count', [('method', m)], s.calls))
+        metric('api_request_duration_seconds', 'histogram', 'Slack API request latency.', latency)
+        metric('api_phase_calls_total', 'counter', 'Slack API requests made in each phase of a run.',
+               [('', [('phase', p), ('method', m)], count) for p, calls in phases for m, count in sorted(calls.items())])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the totals to `path`: JSON if it ends in ".json", otherwise a Prometheus textfile.
+        The file is replaced in one step, so a collector never reads it half-written.
+        """
+        if path.endswith('.json'):
+            content = json.dumps(self.to_dict(), indent=2, sort_keys=True) + "\n"
+        else:
+            content = self.to_prometheus()
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(content)
+        os.rename(temporary, path)
@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class _Pending(object):
+    """A load in progress, which callers arriving while it runs wait on instead of loading again."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class CoalescingCache(object):
+    """
+    A thread-safe cache whose entries expire `ttl` seconds after being loaded.
+
+    `get_or_load` calls for a key that is missing share a single call to the loader: the first caller loads,
+    and everyone arriving while it runs waits for its result.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+            pending = self.pending.get(key)
+            loading = pending is None
+            if loading:
+                pending = self.pending[key] = _Pending()
+
+        if not loading:
+            return pending.wait()
+
+        try:
+            pending.value = loader()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            with self.lock:
+                if not pending.invalidated:
+                    self.entries[key] = (time.time() + self.ttl, pending.value)
+            return pending.value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            pending.done.set()
+
+    def invalidate(self, key):
+        """Drop `key`, including the result of any load of it still in progress."""
+        with self.lock:
+            self.entries.pop(key, None)
+            if key in self.pending:
+                self.pending[key].invalidated = True
@@ -0,0 +1,83 @@
+import collections
+import threading
+
+
+class Span(object):
+    """Every cached record of one channel from between `oldest` and `latest`, oldest first."""
+    __slots__ = ('oldest', 'latest', 'records')
+
+    def __init__(self, oldest, latest, records):
+        self.oldest = oldest
+        self.latest = latest
+        self.records = records
+
+    def between(self, oldest, latest):
+        """Return the records from between `oldest` and `latest`, oldest first."""
+        if oldest <= self.oldest and latest >= self.latest:
+            return list(self.records)
+        return self.records[self.index(oldest):self.index(latest, after=True)]
+
+    def index(self, ts, after=False):
+        """Return the position of the first record newer than `ts` (with `after`) or not older than it."""
+        low, high = 0, len(self.records)
+        while low < high:
+            middle = (low + high) // 2
+            if self.records[middle].ts < ts or (after and self.records[middle].ts == ts):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+class HistoryCache(object):
+    """
+    A thread-safe cache of message history which remembers, per key (channel ID), the continuous time range
+    its records cover. Any part of that range is answered from memory, and for a wider range only the
+    missing ends need fetching.
+
+    Holds at most `max_records` records (plus those of the most recently added key), evicting the least
+    recently used keys first. Records need a numeric `ts`.
+    """
+
+    def __init__(self, max_records):
+        self.max_records = max_records
+        self.spans = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key, oldest, latest):
+        """
+        Return `(older, records, newer)`: the cached records for `key` from between `oldest` and `latest`,
+        oldest first, and the `(oldest, latest)` ranges before and after them that still need fetching
+        (None where nothing does).
+        """
+        with self.lock:
+            span = self.spans.pop(key, None)
+            if span is not None:
+                self.spans[key] = span
+        if span is None or span.latest < oldest or span.oldest > latest:
+            return None, [], (oldest, latest)
+        older = (oldest, span.oldest) if oldest < span.oldest else None
+        newer = (span.latest, latest) if latest > span.latest else None
+        return older, span.between(oldest, latest), newer
+
+    def add(self, key, oldest, latest, records):
+        """
+        Cache `records` (oldest first) as everything for `key` from between `oldest` and `latest`.
+        They are merged with the range already cached if the two meet or overlap, and replace it otherwise.
+        """
+        with self.lock:
+            span = self.spans.pop(key, None)
+            if span is not None:
+                self.size -= len(span.records)
+            if span is None or latest < span.oldest or oldest > span.latest:
+                span = Span(oldest, latest, list(records))
+            else:
+                older = [x for x in records if x.ts < span.oldest]
+                newer = [x for x in records if x.ts > span.latest]
+                span = Span(min(oldest, span.oldest), max(latest, span.latest), older + span.records + newer)
+            self.spans[key] = span
+            self.size += len(span.records)
+            while self.size > self.max_records and len(self.spans) > 1:
+                _, evicted = self.spans.popitem(last=False)
+                self.size -= len(evicted.records)
@@ -0,0 +1,61 @@
+import contextlib
+import cProfile
+import os
+import time
+
+from utils.with_logger import WithLogger
+
+try:
+    cpu_time = time.process_time
+except AttributeError:  # Python 2
+    cpu_time = time.clock
+
+
+class PhaseProfiler(WithLogger):
+    """
+    Profiles each phase of a run with cProfile, writing `<run>-<phase>.prof` files (for pstats or snakeviz)
+    and a `<run>-summary.txt` table of each phase's wall time, CPU time and time waiting on Slack into `directory`.
+
+    cProfile only follows the thread that runs the phase, so work done on channel worker threads shows up
+    in the wall, CPU and HTTP columns but not in the .prof files; set `channel_workers` to 1 for complete profiles.
+    """
+    def __init__(self, directory, metrics):
+        """metrics is the run's utils.api_metrics.ApiMetrics(), whose phase each profiled phase also sets"""
+        self.directory = directory
+        self.metrics = metrics
+        self.run = time.strftime('%Y%m%dT%H%M%S')
+        self.rows = []
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, '{}-{}'.format(self.run, name))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        calls_before, http_before = self.metrics.totals()
+        wall_before, cpu_before = time.time(), cpu_time()
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            with self.metrics.phase(name):
+                yield
+        finally:
+            profile.disable()
+            wall, cpu = time.time() - wall_before, cpu_time() - cpu_before
+            calls, http = self.metrics.totals()
+            profile.dump_stats(self.path(name + '.prof'))
+            self.rows.append((name, wall, cpu, http - http_before, calls - calls_before))
+
+    def summary(self):
+        """Return a table of every phase profiled so far. CPU and HTTP times add up over threads, so may exceed wall time."""
+        lines = ["{:<10} {:>10} {:>10} {:>10} {:>10}".format("phase", "wall (s)", "CPU (s)", "HTTP (s)", "requests")]
+        for name, wall, cpu, http, calls in self.rows:
+            lines.append("{:<10} {:>10.3f} {:>10.3f} {:>10.3f} {:>10}".format(name, wall, cpu, http, calls))
+        return "\n".join(lines)
+
+    def write_summary(self):
+        summary = self.summary()
+        with open(self.path('summary.txt'), 'w') as f:
+            f.write(summary + "\n")
+        self.logger.info("Profiles written to %s\n%s", self.directory, summary)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from utils.with_logger import WithLogger
+
+# Sustained requests per minute allowed by each Slack Web API rate limit tier.
+# See https://api.slack.com/docs/rate-limits
+SLACK_TIERS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+
+class TokenBucket(object):
+    """
+    A token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens.
+    Not thread-safe on its own; RateLimiter serializes access.
+    """
+    def __init__(self, rate, capacity, now):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now):
+        """Take a token, returning how many seconds the caller must wait before it is theirs."""
+        self.refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    def pause(self, seconds, now):
+        """Make the next reservation wait at least `seconds`, e.g. after Slack answered with a Retry-After."""
+        self.refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class RateLimiter(WithLogger):
+    """
+    Proactive, per-method throttling for Slack API calls.
+
+    `limits` maps an API method name (e.g. "channels.history") to its budget, either a Slack rate limit
+    `tier` or an explicit `per_minute` rate, with an optional `burst` size (default 1). With `per_channel` set,
+    every channel gets its own budget for that method. The "default" entry covers methods not listed.
+    """
+    def __init__(self, limits=None):
+        self.limits = dict(limits or {})
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def limit_for(self, method):
+        return self.limits.get(method) or self.limits.get('default') or {'tier': 3}
+
+    def bucket_for(self, method, channel, now):
+        limit = self.limit_for(method)
+        key = (method, channel if limit.get('per_channel') else None)
+        if key not in self.buckets:
+            per_minute = limit.get('per_minute') or SLACK_TIERS[int(limit.get('tier', 3))]
+            self.buckets[key] = TokenBucket(float(per_minute) / 60, limit.get('burst', 1), now)
+        return self.buckets[key]
+
+    def reserve(self, method, channel=None):
+        """Claim a call to `method` (in `channel`), returning the seconds to wait before making it."""
+        with self.lock:
+            now = time.time()
+            return self.bucket_for(method, channel, now).reserve(now)
+
+    def acquire(self, method, channel=None):
+        """Block until a call to `method` (in `channel`) fits within its budget."""
+        delay = self.reserve(method, channel)
+        if delay > 0:
+            self.logger.debug("Throttling %s for %.2fs", method, delay)
+            time.sleep(delay)
+
+    def pause(self, method, seconds, channel=None):
+        """Hold back every caller of `method` (in `channel`) for `seconds`."""
+        with self.lock:
+            now = time.time()
+            self.bucket_for(method, channel, now).pause(seconds, now)
@@ -1,26 +1,123 @@
 import logging
+import threading
+import time
+
+# support Python 2 and 3's versions of this module
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from config import get_config, WithLogger
 
 
+class _Flush(object):
+    """Queued by `SlackHandler.flush`: posts everything queued before it, then sets `done`."""
+    def __init__(self):
+        self.done = threading.Event()
+
+
 class SlackHandler(logging.Handler, WithLogger):
     """
     A logging.Handler subclass for logging messages into a Slack channel.
 
+    Records are queued and posted by a background thread, so logging never waits on Slack. Records arriving
+    within `flush_interval` seconds of each other are joined into one message of up to `max_message_length`
+    characters. If more than `max_queued` records are waiting, further ones are dropped and counted instead.
+
     See also: https://docs.python.org/3/library/logging.html#handler-objects
     """
+    flush_interval = 2.0
+    max_message_length = 3000
+    max_queued = 1000
+
     def __init__(self, slackbot, level):
         """
         `slackbot` is an initialized Slackbot() object
-        `log_channel` is the name of a channel that should receive log messages
         `level` is the log level to use for logging to the Slack channel
+        Messages go to the `log_channel` configured when the handler is created.
         """
         super(self.__class__, self).__init__(level)  # pylint: disable=E1003
         self.slackbot = slackbot
+        self.log_channel = get_config().log_channel
+        self.records = queue.Queue(self.max_queued)
+        self.dropped = 0
+        self.thread = None
+        self.state_lock = threading.Lock()
 
     def emit(self, record):
         """Do whatever it takes to actually log the specified logging record."""
-        self.slackbot.say(self.config.log_channel, record.getMessage())
+        if threading.current_thread() is self.thread:
+            # posting to Slack must not queue more records to post
+            return
+        self.start()
+        try:
+            self.records.put_nowait(record.getMessage())
+        except queue.Full:
+            with self.state_lock:
+                self.dropped += 1
+
+    def start(self):
+        with self.state_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.drain)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def flush(self, timeout=10):
+        """Wait up to `timeout` seconds for the records queued so far to be posted."""
+        if self.thread is None:
+            return
+        flushed = _Flush()
+        try:
+            self.records.put(flushed, timeout=timeout)
+        except queue.Full:
+            return
+        flushed.done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        super(self.__class__, self).close()  # pylint: disable=E1003
+
+    def drain(self):
+        lines, length, deadline = [], 0, None
+        while True:
+            try:
+                item = self.records.get(timeout=max(0, deadline - time.time()) if lines else None)
+            except queue.Empty:
+                item = None
+            if item is None or isinstance(item, _Flush):
+                self.post(lines)
+                lines, length = [], 0
+                if item is not None:
+                    item.done.set()
+                continue
+            if lines and length + len(item) + 1 > self.max_message_length:
+                self.post(lines)
+                lines, length = [], 0
+            if not lines:
+                deadline = time.time() + self.flush_interval
+            lines.append(item)
+            length += len(item) + 1
+
+    def post(self, lines):
+        with self.state_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines = lines + ["({} more log records were dropped)".format(dropped)]
+        if not lines:
+            return
+        try:
+            self.slackbot.say(self.log_channel, "\n".join(lines))
+        except Exception:  # pylint: disable=W0703
+            self.logger.warning("Couldn't post log records to #%s", self.log_channel, exc_info=True)
+
+
+def flush_slack_logger():
+    """Wait for log records queued for the Slack channel to be posted."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, SlackHandler):
+            handler.flush()
 
 
 def set_up_slack_logger(slackbot=None):
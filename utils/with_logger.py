@@ -1,7 +1,65 @@
+import contextlib
 import logging
+import sys
+import threading
+
+_deferred = threading.local()
 
 
 class WithLogger(object):
     @property
     def logger(self):
-        return logging.getLogger(type(self).__name__)
+        logger = logging.getLogger(type(self).__name__)
+        records = getattr(_deferred, 'records', None)
+        if records is not None:
+            return DeferredLogger(logger, records)
+        return logger
+
+
+class DeferredLogger(object):
+    """
+    Stands in for a `logging.Logger` while logs are being captured on the current thread.
+    Records are built immediately (so they keep their timestamps) but only handled on `replay_logs`.
+    """
+    def __init__(self, logger, records):
+        self.logger = logger
+        self.records = records
+
+    def _log(self, level, msg, args, exc_info=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        self.records.append(self.logger.makeRecord(self.logger.name, level, "(deferred)", 0, msg, args, exc_info))
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, **kwargs)
+
+
+@contextlib.contextmanager
+def capture_logs():
+    """
+    Hold back every `WithLogger` log record made on the current thread,
+    collecting them into a list that can later be passed to `replay_logs`.
+    """
+    previous = getattr(_deferred, 'records', None)
+    _deferred.records = []
+    try:
+        yield _deferred.records
+    finally:
+        _deferred.records = previous
+
+
+def replay_logs(records):
+    """Hand previously captured log records to their loggers' handlers, in order."""
+    for record in records:
+        logging.getLogger(record.name).handle(record)
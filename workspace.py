@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+
+import time
+
+from activity_index import ActivityIndex
+from config import WithConfig
+from flagger_state import FlaggerState
+from ignore_rules import IgnoreRules
+import slackbot
+import slacker
+
+from utils.api_metrics import ApiMetrics
+from utils.history_cache import HistoryCache
+from utils.rate_limiter import RateLimiter
+from utils.slack_logging import set_up_slack_logger
+from utils.with_logger import WithLogger
+
+
+class Workspace(WithLogger, WithConfig):
+    """
+    A run-scoped snapshot of a Slack workspace.
+
+    Bootstraps the user and channel directories once and holds the history cache, so that every
+    phase of a run (archiving, warning, announcing, flagging) can share them instead of
+    downloading them again.
+    """
+
+    def __init__(self, slackbot_injected=None, slacker_injected=None):
+        """
+        slackbot_injected should be an initialized slackbot.Slackbot() object
+        slacker_injected should be an initialized slacker.Slacker() object
+        """
+        # one budget per API method for the whole workspace, shared by Slackbot and Slacker
+        self.rate_limiter = RateLimiter(self.config.rate_limits)
+        # request counts for the whole run; injected clients keep their own
+        self.metrics = ApiMetrics()
+
+        with self.metrics.phase('bootstrap'):
+            self.slackbot = slackbot_injected or slackbot.Slackbot(self.config.slack_name, token=self.config.sb_token,
+                                                                   rate_limiter=self.rate_limiter, metrics=self.metrics)
+            set_up_slack_logger(self.slackbot)
+
+            self.slacker = slacker_injected or slacker.Slacker(self.config.slack_name, token=self.config.api_token,
+                                                               rate_limiter=self.rate_limiter, metrics=self.metrics)
+
+        # channel history, shared by every Destalinator built on this workspace; their windows all end at
+        # the time the run started, so a window one phase has read answers the narrower ones of later phases
+        self.now = int(time.time())
+        self.cache = HistoryCache(int(self.config.history_cache_size or 0))
+
+        self.activity_index = None
+        if self.config.activity_index_path:
+            # entries recorded under different rules for what counts as activity are not reused
+            ignore_rules = IgnoreRules.from_config(self.config)
+            rules = {'ignore_users': sorted(ignore_rules.ignore_users), 'included_subtypes': sorted(ignore_rules.included_subtypes)}
+            self.activity_index = ActivityIndex(self.config.activity_index_path, rules)
+
+        self.flagger_state = FlaggerState(self.config.flagger_state_path) if self.config.flagger_state_path else None